@@ -1,14 +1,24 @@
+from typing import TYPE_CHECKING, Any
 from .utils import reformat
 from .database import Database, DBInput
-from .analysis import (
-    Hit_distribution, Shower_depth, Shower_waist, Plane_hits, Scattering, report,
-    Matrix, Normaliced_matrix, Standardised_matrix
-)
 
-__all__ = [
-    "reformat",
-    "Database",
-    "DBInput",
+if TYPE_CHECKING:
+    # Explicit re-exports, __all__ is built at runtime
+    from .analysis import (  # noqa: F401
+        Hit_distribution as Hit_distribution,
+        Shower_depth as Shower_depth,
+        Shower_waist as Shower_waist,
+        Plane_hits as Plane_hits,
+        Scattering as Scattering,
+        report as report,
+        Matrix as Matrix,
+        Normaliced_matrix as Normaliced_matrix,
+        Standardised_matrix as Standardised_matrix
+    )
+
+# Analysis utilities are imported on first access, so that using the
+# database alone does not load pandas and matplotlib
+_ANALYSIS = (
     "Hit_distribution",
     "Shower_depth",
     "Shower_waist",
@@ -18,4 +28,19 @@ __all__ = [
     "Matrix",
     "Normaliced_matrix",
     "Standardised_matrix"
+)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _ANALYSIS:
+        from . import analysis
+        return getattr(analysis, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "reformat",
+    "Database",
+    "DBInput",
+    *_ANALYSIS
 ]
@@ -1,14 +1,94 @@
 from mingo import Database
-from sqlalchemy import select, Subquery, Select, Float
-from sqlalchemy import func
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.axes import Axes
-from matplotlib.backends.backend_pgf import PdfPages
-from typing import Any, Sequence, Literal
+from sqlalchemy import select, Subquery, Select, Float, Integer, bindparam
+from sqlalchemy import func, Connection
+from typing import Any, Sequence, Literal, TYPE_CHECKING
 from dataclasses import dataclass
 import pandas as pd
 import numpy as np
+import numpy.typing as npt
+
+# Matplotlib is imported by the plotting methods, on first use
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+    from matplotlib.axes import Axes
+
+# Number of rows fetched at a time from server-side cursors
+_CHUNK_SIZE = 10_000
+
+# Columns of the stats tables
+_STATS_COLUMNS = ["e_0", "avg", "std", "skewness", "kurtosis", "median",
+                  "avg / std"]
+
+# Columns of the distribution tables
+_HIST_COLUMNS = ["e_0", "val", "count"]
+
+# Subplot grid (rows, columns) for each number of labels in a figure
+_SUBPLOT_GRID = (None, (1, 1), (1, 2), (2, 2), (2, 2), (2, 3), (2, 3))
+
+
+def _energy_bounds(e_0: npt.NDArray[np.float64]) -> npt.NDArray[np.intp]:
+    """
+    Indices where each initial energy starts in a column sorted by energy,
+    followed by the length of the column
+
+    :param e_0: Initial energy of each row
+    """
+
+    starts = np.flatnonzero(np.diff(e_0, prepend=np.nan) != 0)
+
+    return np.append(starts, len(e_0))
+
+
+def _hist_stats(hist: pd.DataFrame) -> pd.DataFrame:
+    """
+    Statistical descriptors of a distribution computed from its histogram
+
+    Equivalent to Base.stats when the histogram bins are the exact values of
+    the property (no rounding).
+
+    :param hist: Values and counts for each initial energy, sorted by energy
+    :return: Descriptors with the same layout as Base.stats
+    :raise ZeroDivisionError: If the distribution of an energy has a single
+    value, as the query of Base.stats fails on a division by zero
+    """
+
+    if hist.empty:
+        return pd.DataFrame(columns=_STATS_COLUMNS, dtype=float)
+
+    # Process every energy in a single pass over the columns
+    val = hist["val"].to_numpy(dtype=float)
+    count = hist["count"].to_numpy(dtype=float)
+    bounds = _energy_bounds(hist["e_0"].to_numpy())
+    starts, sizes = bounds[:-1], np.diff(bounds)
+    e_0 = hist["e_0"].to_numpy(dtype=float)[starts]
+
+    # Higher moments are divided by the std, which is null when all the
+    # events of an energy share the same value (a single bin)
+    if (sizes == 1).any():
+        raise ZeroDivisionError(
+            f"Null standard deviation for initial energy {e_0[sizes == 1][0]}"
+        )
+
+    n = np.add.reduceat(count, starts)
+    avg = np.add.reduceat(val * count, starts) / n
+    dev = val - np.repeat(avg, sizes)
+    std = np.sqrt(np.add.reduceat(dev ** 2 * count, starts) / n)
+    skewness = np.add.reduceat(dev ** 3 * count, starts) / (n * std ** 3)
+    kurtosis = np.add.reduceat(dev ** 4 * count, starts) / (n * std ** 4)
+
+    # Linear interpolation between central values as percentile_cont
+    cumcount = np.cumsum(count)
+    offset = cumcount[starts] - count[starts]
+    pos = 0.5 * (n - 1)
+    low = np.searchsorted(cumcount, offset + np.floor(pos), side="right")
+    high = np.searchsorted(cumcount, offset + np.ceil(pos), side="right")
+    median = val[low] + (pos - np.floor(pos)) * (val[high] - val[low])
+
+    return pd.DataFrame(
+        np.column_stack([e_0, avg, std, skewness, kurtosis,
+                         median, avg / std]),
+        columns=_STATS_COLUMNS
+    )
 
 
 @dataclass
@@ -38,6 +118,9 @@ class Base:
     """
     __name__ = "Base"
 
+    # Whether stats can be derived from the distribution without a query
+    _stats_from_hist = False
+
     def __init__(self, db: Database) -> None:
 
         # Database objects
@@ -48,9 +131,17 @@ class Base:
         self.hit = db.hit.c
 
         # Data storage
+        self.hist_data: dict[str, pd.DataFrame] = {}
         self.dist_data: dict[str, dict[float, Any]] = {}
         self.stats_data: dict[str, pd.DataFrame] = {}
 
+        # Configuration ID of the data stored under each label by __call__
+        self._computed: dict[str, int] = {}
+
+        # Statements built with a bound configuration ID, reused across calls
+        self._stmt_cache: dict[tuple[str, int | None, float | None],
+                               Select[Any]] = {}
+
         # Plot configuration
         self.plot_config = Plot_config()
 
@@ -61,9 +152,12 @@ class Base:
         Distribution of given property as function of the initial energy
         of the primary cosmic ray.
 
-        Specific behavior is defined by the _dist_tmp and _dist_stmt methods.
+        Specific behavior is defined by the _hist_stmt method.
 
-        Results are saved to self.dist_data
+        Results are saved to self.hist_data, as a table with columns e_0, val
+        and count, and to self.dist_data, as pairs of values and counts for
+        each initial energy. Both share the same memory, counts have the
+        type of the values.
 
         :param id: ID of desired detector configuration
         :param label: Title for associated plots
@@ -72,30 +166,71 @@ class Base:
         R = kwargs["R"] if "R" in kwargs else None
         plane_num = kwargs["plane_num"] if "plane_num" in kwargs else None
 
-        self.dist_data[label] = {}
+        self._computed.pop(label, None)
+
+        stmt = self._get_stmt("hist", plane_num, R)
 
+        # Stream the histogram in chunks to bound the memory used by the driver
         with self.db.engine.connect() as conn:
+            if not self._has_events(conn, id):
+                self.hist_data[label] = pd.DataFrame(columns=_HIST_COLUMNS)
+                self.dist_data[label] = {}
+                return None
+            conn = conn.execution_options(stream_results=True)
+            result = pd.concat(
+                pd.read_sql_query(stmt, conn, params={"id": id},
+                                  chunksize=_CHUNK_SIZE),
+                ignore_index=True
+            )
+
+        # Values and counts are stored once, in a single (2, N) array. Both
+        # the table and the distribution of each energy are views of it.
+        # Integer histograms (values and counts) fit in 32 bits
+        e_0 = result["e_0"].to_numpy()
+        hist = np.vstack((result["val"].to_numpy(),
+                          result["count"].to_numpy()))
+        if pd.api.types.is_integer_dtype(result["val"]):
+            hist = hist.astype(np.int32)
+
+        self.hist_data[label] = pd.DataFrame(
+            {"e_0": e_0, "val": hist[0], "count": hist[1]}, copy=False
+        )
 
-            energies = conn.execute(select(self.event.e_0)
-                                    .where(self.event.fk_config == id)
-                                    .distinct()
-                                    .order_by(self.event.e_0))
+        bounds = _energy_bounds(e_0)
+        self.dist_data[label] = {
+            float(e_0[start]): hist[:, start:end]
+            for start, end in zip(bounds[:-1], bounds[1:])
+        }
 
-            for energy, in energies:
+        return None
 
-                tmp = self._dist_tmp(id, energy, plane_num, R)
-                stmt = self._dist_stmt(tmp, id, energy)
+    def _has_events(self, conn: Connection, id: int) -> bool:
+        """
+        Check whether there are events for a detector configuration without
+        running the aggregation queries
 
-                _result = conn.execute(stmt).fetchall()
+        :param conn: Connection to the database
+        :param id: ID of desired detector configuration
+        """
 
-                _data = np.array([
-                    [val, count] for val, count in conn.execute(stmt)
-                ])
+        return conn.execute(select(self.event.id)
+                            .where(self.event.fk_config == id)
+                            .limit(1)).first() is not None
 
-                if _result != []:
-                    self.dist_data[label][energy] = _data.swapaxes(0, 1)
+    def _hist_stmt(self, id: int, plane_num: int | None,
+                   R: float | None) -> Select[tuple[float, Any, int]]:
+        """
+        Implementation of the distribution's query for each specific property
 
-        return None
+        The query must return the columns e_0, val and count, grouped by
+        initial energy and value of the property.
+
+        :param id: ID of desired detector configuration
+        :param plane_num: Plane number (First is 1, last is 4)
+        :param R: Rounding factor
+        """
+
+        raise NotImplementedError()
 
     def _dist_tmp(self, id: int, energy: float,
                   plane_num: int | None, R: float | None) -> None | Subquery:
@@ -139,61 +274,95 @@ class Base:
 
         plane_num = kwargs["plane_num"] if "plane_num" in kwargs else None
 
+        self._computed.pop(label, None)
+
+        stmt = self._get_stmt("stats", plane_num, None)
+
+        with self.db.engine.connect() as conn:
+            if self._has_events(conn, id):
+                result = pd.read_sql_query(stmt, conn, params={"id": id})
+            else:
+                result = pd.DataFrame(columns=_STATS_COLUMNS, dtype=float)
+
+        self.stats_data[label] = result
+
+        return None
+
+    def _stats_stmt(self, id: int, plane_num: int | None) -> Select[Any]:
+        """
+        Query for the statistical descriptors of the property
+
+        :param id: ID of desired detector configuration
+        :param plane_num: Plane number
+        """
+
         tmp = self._stats_tmp(id, plane_num)
 
-        _tmp = (
+        # Mean of each energy, joined back to the values so that central
+        # moments are aggregated directly. Deriving them from raw moments
+        # loses all precision when the mean is large compared to the std
+        _avg = (
             select(tmp.c.e_0.label("e_0"),
-                   tmp.c.val.label("val"),
-                   func.avg(tmp.c.val, type_=Float)
-                   .over(tmp.c.e_0)
-                   .label("avg")).alias("_tmp")
+                   func.avg(tmp.c.val, type_=Float).label("avg"))
+            .group_by(tmp.c.e_0)
+            .subquery("_avg")
         )
 
-        _func_std = func.sqrt(func.sum(func.pow(_tmp.c.val - _tmp.c.avg, 2)) /
-                              func.count(_tmp.c.val), type_=Float)
+        _m2, _m3, _m4 = (
+            func.avg(func.pow(tmp.c.val - _avg.c.avg, k, type_=Float),
+                     type_=Float)
+            for k in range(2, 5)
+        )
 
-        _func_skewness = (
-            func.sum(func.pow(_tmp.c.val - _tmp.c.avg, 3, type_=Float)) /
-            (func.count(_tmp.c.val) * func.pow(_func_std, 3, type_=Float)))
+        _func_std = func.sqrt(_m2, type_=Float)
 
-        # _func_skewness = (func.sum(func.pow(_tmp.c.val - _tmp.c.avg, 3)) /
-        #                   (func.count(_tmp.c.val) * func.pow(_func_std, 3)))
+        _func_skewness = _m3 / func.pow(_func_std, 3, type_=Float)
 
-        _func_kurtosis = (
-            func.sum(func.pow(_tmp.c.val - _tmp.c.avg, 4, type_=Float)) /
-            (func.count(_tmp.c.val) * func.pow(_func_std, 4, type_=Float)))
+        _func_kurtosis = _m4 / func.pow(_m2, 2, type_=Float)
 
-        # _func_kurtosis = (func.sum(func.pow(_tmp.c.val - _tmp.c.avg, 4)) /
-        #                   (func.count(_tmp.c.val) * func.pow(_func_std, 4)))
+        _func_median = (func.percentile_cont(0.5)
+                        .within_group(tmp.c.val))
 
-        with self.db.engine.connect() as conn:
+        # All descriptors are computed by the database in a single query
+        stmt = (
+            select(tmp.c.e_0.label("e_0"),
+                   _avg.c.avg.label("avg"),
+                   _func_std.label("std"),
+                   _func_skewness.label("skewness"),
+                   _func_kurtosis.label("kurtosis"),
+                   _func_median.label("median"),
+                   (_avg.c.avg / _func_std).label("avg / std"))
+            .join_from(tmp, _avg, tmp.c.e_0 == _avg.c.e_0)
+            .group_by(tmp.c.e_0, _avg.c.avg)
+            .order_by(tmp.c.e_0)
+        )
 
-            result = pd.DataFrame(
-                [
-                    [e_0, avg, std, skew, kurt]
-                    for e_0, avg, std, skew, kurt in conn.execute(
-                        select(_tmp.c.e_0,
-                               func.avg(_tmp.c.val, type_=Float),
-                               _func_std,
-                               _func_skewness,
-                               _func_kurtosis).group_by(_tmp.c.e_0)
-                    )
-                ], columns=["e_0", "avg", "std", "skewness", "kurtosis"]
-            )
+        return stmt
 
-            result["median"] = [
-                median for e_0, median in conn.execute(
-                    select(tmp.c.e_0,
-                           func.percentile_cont(0.5)
-                           .within_group(tmp.c.val)).group_by(tmp.c.e_0)
-                )
-            ]
+    def _get_stmt(self, kind: Literal["hist", "stats"],
+                  plane_num: int | None, R: float | None) -> Select[Any]:
+        """
+        Get the distribution or stats query with the configuration ID as a
+        bound parameter named "id"
 
-        result["avg / std"] = result["avg"] / result["std"]
+        Statements are built once for each set of arguments and reused, so
+        that they are not rebuilt for every configuration.
 
-        self.stats_data[label] = result
+        :param kind: Either "hist" for distribution or "stats"
+        :param plane_num: Plane number
+        :param R: Rounding factor
+        """
 
-        return None
+        key = (kind, plane_num, R)
+
+        if key not in self._stmt_cache:
+            _id: Any = bindparam("id", type_=Integer)
+            if kind == "hist":
+                self._stmt_cache[key] = self._hist_stmt(_id, plane_num, R)
+            else:
+                self._stmt_cache[key] = self._stats_stmt(_id, plane_num)
+
+        return self._stmt_cache[key]
 
     def _stats_tmp(self, id: int, plane_num: int | None) -> Subquery:
         """
@@ -207,7 +376,7 @@ class Base:
 
     def _make_figure(self,
                      figsize: tuple[int, int] = (12, 6)
-                     ) -> tuple[Figure, Sequence[Axes]]:
+                     ) -> tuple["Figure", Sequence["Axes"]]:
         """
         Generate figure for distribution or stats plots with appropriate
         number of subplots
@@ -217,26 +386,51 @@ class Base:
         :return axs: Sequence of axes associated with subplots
         """
 
-        match len(self.dist_data.keys()):
-            case 1:
-                fig, axs = plt.subplots(1, 1, figsize=figsize)
-                axs = [axs]
-            case 2:
-                fig, axs = plt.subplots(1, 2, figsize=figsize)
-            case 3:
-                fig, axs = plt.subplots(2, 2, figsize=figsize)
-            case 4:
-                fig, axs = plt.subplots(2, 2, figsize=figsize)
-            case 5:
-                fig, axs = plt.subplots(2, 3, figsize=figsize)
-            case 6:
-                fig, axs = plt.subplots(2, 3, figsize=figsize)
-            case _:
-                raise ValueError("Too many values for a single figure")
+        import matplotlib.pyplot as plt
+
+        n_items = len(self.dist_data)
+        grid = _SUBPLOT_GRID[n_items] if n_items < len(_SUBPLOT_GRID) else None
+        if grid is None:
+            raise ValueError("Too many values for a single figure")
+
+        fig, _axs = plt.subplots(*grid, figsize=figsize, squeeze=False)
+        axs = _axs.flatten()
 
         return fig, axs     # type: ignore
 
-    def plot_distribution(self) -> Figure:
+    def _plot_dist(self, ax: "Axes",
+                   dist: dict[float, npt.NDArray[np.float64]],
+                   **kwargs) -> None:
+        """
+        Draw the distributions of all the energies of a label as a single
+        collection of lines
+
+        :param ax: Axes where the distributions are drawn
+        :param dist: Pairs of values and counts for each initial energy
+        :param kwargs: Additional arguments for the legend
+        """
+
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        from matplotlib.lines import Line2D
+
+        linewidth = kwargs.pop("linewidth", None)
+
+        colors = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+        colors = [colors[idx % len(colors)] for idx in range(len(dist))]
+
+        lines = LineCollection([hist.T for hist in dist.values()],
+                               colors=colors, linewidths=linewidth)
+        ax.add_collection(lines)
+        ax.autoscale_view()
+
+        handles = [Line2D([], [], color=color, linewidth=linewidth)
+                   for color in colors]
+        ax.legend(handles, [f"{e:.0f} MeV" for e in dist], **kwargs)
+
+        return None
+
+    def plot_distribution(self) -> "Figure":
         """
         Generate distribution plots from data in self.dist_data
 
@@ -252,14 +446,12 @@ class Base:
 
         for ax, key in zip(axs, self.dist_data):
 
-            for e, (val, count) in self.dist_data[key].items():
-                ax.plot(val, count, label=f"{e:.0f} MeV")
+            self._plot_dist(ax, self.dist_data[key])
 
             ax.set_xscale(self.plot_config.xscale)
             ax.set_yscale(self.plot_config.yscale)
             ax.set_title(key)
             ax.set_xlabel(self.plot_config.label)
-            ax.legend()
 
             xlim = max(xlim, ax.get_xlim()[1])
             ylim = max(ylim, ax.get_ylim()[1])
@@ -273,7 +465,7 @@ class Base:
 
         return fig
 
-    def plot_stats(self) -> Figure:
+    def plot_stats(self) -> "Figure":
         """
         Generate stats plots from data in self.stats_data.
 
@@ -316,7 +508,7 @@ class Base:
 
         return fig
 
-    def report_figure(self) -> Figure:
+    def report_figure(self) -> "Figure":
         """
         Generate pairs of distribution plots and stats tables.
 
@@ -325,6 +517,8 @@ class Base:
         :return fig: Figure with plots and tables
         """
 
+        import matplotlib.pyplot as plt
+
         # Figure configuration
 
         label_font = {"weight": "light", "size": "small"}
@@ -354,8 +548,7 @@ class Base:
             ax_table = fig.add_subplot(spec[idx, 1])
 
             # Plot distribution
-            for e, (val, count) in dist.items():
-                ax_plot.plot(val, count, label=f"{e:.0f} MeV", linewidth=1)
+            self._plot_dist(ax_plot, dist, linewidth=1, fontsize="xx-small")
 
             ax_plot.set_xscale(self.plot_config.xscale)
             ax_plot.set_yscale(self.plot_config.yscale)
@@ -364,7 +557,6 @@ class Base:
             ax_plot.set_ylabel("Number of events",
                                fontdict=label_font, labelpad=1)
             ax_plot.tick_params(labelsize="x-small")
-            ax_plot.legend(fontsize="xx-small")
 
             xlim = max(xlim, ax_plot.get_xlim()[1])
             ylim = max(ylim, ax_plot.get_ylim()[1])
@@ -395,12 +587,37 @@ class Base:
         """
         Executes the distribution and stats methods in one call
 
+        Queries are skipped if the data for the same configuration is already
+        stored under the given label. If the distribution is not rounded, stats
+        are derived from it instead of querying the database again.
+
         :param id: ID of desired detector configuration
         :param label: Title for associated plots
         """
 
+        if self._computed.get(label) == id:
+            return None
+
         self.distribution(id, label)
-        self.stats(id, label)
+        if self._stats_from_hist:
+            self.stats_data[label] = _hist_stats(self.hist_data[label])
+        else:
+            self.stats(id, label)
+        self._computed[label] = id
+
+        return None
+
+    def invalidate(self, id: int | None = None) -> None:
+        """
+        Discard cached results so that the next call queries the database
+
+        :param id: ID of detector configuration to discard. All cached results
+        are discarded if None.
+        """
+
+        for label, _id in list(self._computed.items()):
+            if id is None or _id == id:
+                del self._computed[label]
 
         return None
 
@@ -415,6 +632,8 @@ class Hit_distribution(Base):
 
     __name__ = "Hit distribution"
 
+    _stats_from_hist = True
+
     def __init__(self, db: Database) -> None:
 
         super().__init__(db)
@@ -447,6 +666,16 @@ class Hit_distribution(Base):
     def distribution(self, id: int, label: str, **kwargs) -> None:
         return super().distribution(id, label)
 
+    def _hist_stmt(self, id: int, plane_num: int | None,
+                   R: float | None) -> Select[tuple[float, Any, int]]:
+
+        return (select(self.event.e_0.label("e_0"),
+                       self.event.n_hits.label("val"),
+                       func.count(self.event.e_0).label("count"))
+                .where(self.event.fk_config == id)
+                .group_by(self.event.e_0, self.event.n_hits)
+                .order_by(self.event.e_0, self.event.n_hits))
+
     def _dist_tmp(self, id: int, energy: float,
                   plane_num: int | None, R: float | None) -> Subquery | None:
 
@@ -497,6 +726,25 @@ class Shower_depth(Base):
     def distribution(self, id: int, label: str, **kwargs) -> None:
         return super().distribution(id, label, R=5)
 
+    def _hist_stmt(self, id: int, plane_num: int | None,
+                   R: float | None) -> Select[tuple[float, Any, int]]:
+
+        tmp = (
+            select(self.event.e_0.label("e_0"),
+                   (func.round(func.avg(self.hit.z, type_=Float) / R) * R)
+                   .label("val"))
+            .select_from(self.db.hit
+                         .join(self.db.event,
+                               self.event.id == self.hit.fk_event))
+            .where(self.event.fk_config == id)
+            .group_by(self.event.id)
+            .alias("tmp"))
+
+        return (select(tmp.c.e_0, tmp.c.val,
+                       func.count(tmp.c.val).label("count"))
+                .group_by(tmp.c.e_0, tmp.c.val)
+                .order_by(tmp.c.e_0, tmp.c.val))
+
     def _dist_tmp(self, id: int, energy: float,
                   plane_num: int | None, R: float | None) -> Subquery | None:
 
@@ -572,6 +820,26 @@ class Shower_waist(Base):
     def distribution(self, id: int, label: str, **kwargs) -> None:
         return super().distribution(id, label, R=5)
 
+    def _hist_stmt(self, id: int, plane_num: int | None,
+                   R: float | None) -> Select[tuple[float, Any, int]]:
+
+        tmp = (
+            select(self.event.e_0.label("e_0"),
+                   (func.round(func.max(func.sqrt(
+                       self.hit.x * self.hit.x + self.hit.y * self.hit.y
+                   )) / R) * R).label("val"))
+            .select_from(self.db.hit
+                         .join(self.db.event,
+                               self.event.id == self.hit.fk_event))
+            .where(self.event.fk_config == id)
+            .group_by(self.event.id)
+            .alias("tmp"))
+
+        return (select(tmp.c.e_0, tmp.c.val,
+                       func.count(tmp.c.val).label("count"))
+                .group_by(tmp.c.e_0, tmp.c.val)
+                .order_by(tmp.c.e_0, tmp.c.val))
+
     def _dist_tmp(self, id: int, energy: float,
                   plane_num: int | None, R: float | None) -> Subquery | None:
 
@@ -626,6 +894,8 @@ class Plane_hits(Base):
     :param plane: Plane number (First is 1 last is 4)
     """
 
+    _stats_from_hist = True
+
     def __init__(self, db: Database, plane: int) -> None:
 
         super().__init__(db)
@@ -646,6 +916,26 @@ class Plane_hits(Base):
 
         return None
 
+    def _hist_stmt(self, id: int, plane_num: int | None,
+                   R: float | None) -> Select[tuple[float, Any, int]]:
+
+        tmp = (
+            select(self.event.e_0.label("e_0"),
+                   func.count(self.hit.id).label("val"))
+            .select_from(self.db.hit
+                         .join(self.db.event,
+                               self.event.id == self.hit.fk_event))
+            .where(self.event.fk_config == id,
+                   self.hit.plane == plane_num)
+            .group_by(self.event.id)
+            .alias("tmp")
+        )
+
+        return (select(tmp.c.e_0, tmp.c.val,
+                       func.count(tmp.c.val).label("count"))
+                .group_by(tmp.c.e_0, tmp.c.val)
+                .order_by(tmp.c.e_0, tmp.c.val))
+
     def _dist_tmp(self, id: int, energy: float,
                   plane_num: int | None, R: float | None) -> Subquery | None:
 
@@ -725,6 +1015,28 @@ class Scattering(Base):
 
         return None
 
+    def _hist_stmt(self, id: int, plane_num: int | None,
+                   R: float | None) -> Select[tuple[float, Any, int]]:
+
+        tmp = (
+            select(self.event.e_0.label("e_0"),
+                   (func.round(func.avg(func.sqrt(
+                       self.hit.x * self.hit.x + self.hit.y * self.hit.y
+                   )) * R) / R).label("val"))
+            .select_from(self.db.event
+                         .join(self.db.hit,
+                               self.event.id == self.hit.fk_event))
+            .where(self.event.fk_config == id,
+                   self.hit.plane == plane_num)
+            .group_by(self.event.id)
+            .alias("tmp")
+        )
+
+        return (select(tmp.c.e_0, tmp.c.val,
+                       func.count(tmp.c.val).label("count"))
+                .group_by(tmp.c.e_0, tmp.c.val)
+                .order_by(tmp.c.e_0, tmp.c.val))
+
     def _dist_tmp(self, id: int, energy: float,
                   plane_num: int | None, R: float | None) -> Subquery | None:
 
@@ -819,6 +1131,8 @@ def report(db: Database,
                 Scattering(db, 2), Scattering(db, 3), Scattering(db, 4),
                 ]
 
+    from matplotlib.backends.backend_pgf import PdfPages
+
     with PdfPages(path) as file:
         for obj in obj_list:
             obj.plot_config.yscale = scale
@@ -889,13 +1203,11 @@ class Matrix:
                 _tmp = obj._dist_tmp(id, energy, plane_num, R = R)
                 _stmt = obj._dist_stmt(_tmp, id, energy, grouped = False)
 
-                _result = conn.execute(_stmt).fetchall()
+                _result = conn.scalars(_stmt).all()
 
-                _data = np.array([
-                    row[0] for row in conn.execute(_stmt)])
-                    
                 if _result != []:
-                    self.variables_data[label] = _data
+                    self.variables_data[label] = np.fromiter(
+                        _result, dtype=float, count=len(_result))
 
         return self.variables_data
     
@@ -999,7 +1311,7 @@ class Matrix:
     
 
     def print_eigenvalues(self, id: int | None = None, energy: float | None = None, 
-                        matrix: np.ndarray | None = None, **kwargs) -> Figure:
+                        matrix: np.ndarray | None = None, **kwargs) -> "Figure":
         
         '''
         Method to plot a table with the values of the eigenvalues.
@@ -1008,6 +1320,8 @@ class Matrix:
         call get_eigenvalues method before)
         '''
 
+        import matplotlib.pyplot as plt
+
         if matrix is None:
             _eigenvalues = self.eigenvalues
         else:
@@ -1040,7 +1354,7 @@ class Matrix:
         return None
     
     def print_eigenvectors(self , id: int | None = None, energy: float | None = None,
-                          matrix: np.ndarray | None = None, **kwargs) -> Figure:
+                          matrix: np.ndarray | None = None, **kwargs) -> "Figure":
         
         '''
         Method to plot a table with the values of the eigenvectors.
@@ -1048,6 +1362,8 @@ class Matrix:
         If no matrix given, it uses the stored eigenvectors (you need to
         call get_eigenvalues method before)
         '''
+
+        import matplotlib.pyplot as plt
         
         if matrix is None:
             _eigenvectors = self.eigenvectors
@@ -1082,7 +1398,7 @@ class Matrix:
         return None
     
     def print_variability(self , id: int | None = None, energy: float | None = None,
-                          matrix: np.ndarray | None = None, **kwargs) -> Figure:
+                          matrix: np.ndarray | None = None, **kwargs) -> "Figure":
         
         '''
         Method to plot the variability explained by each eigenvalue.
@@ -1090,6 +1406,8 @@ class Matrix:
         If no matrix given, it uses the stored eigenvalues (you need to
         call get_eigenvalues method before)
         '''
+
+        import matplotlib.pyplot as plt
         
         if matrix is None:
             _eigenvalues = self.eigenvalues
@@ -1,18 +1,36 @@
-from typing import Iterable, Sequence, Mapping
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import get_context
+from typing import (
+    Iterable, Iterator, Sequence, Mapping, TextIO, TYPE_CHECKING
+)
 from pathlib import Path
+import numpy as np
 from sqlalchemy import (
     URL, create_engine, MetaData, Table, Column, Integer, Float,
-    select, func, UniqueConstraint, ForeignKeyConstraint
+    select, bindparam, and_, or_, literal, literal_column, UniqueConstraint,
+    ForeignKeyConstraint, Index, Connection
 )
 from sqlalchemy.dialects.postgresql import ENUM, insert
 from sqlalchemy.exc import OperationalError
 import sqlalchemy_utils as sqlutils
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, astuple
 from .errors import DatabaseCreationError, DataFileFormatError
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Expected length of the header section of source files
 HEADER_LINES = 45
 
+# Lines of the data section of source files inserted at once
+CHUNK_LINES = 10_000
+
+# Size in bytes of the buffer used to read source files
+READ_BUFFER_SIZE = 1 << 22
+
 # Valid extensions for data-files and directories
 VALID_EXTENSIONS = (".txt", ".csv", "")
 
@@ -20,6 +38,111 @@ VALID_EXTENSIONS = (".txt", ".csv", "")
 MATERIAL = ("Pb", "Fe", "W", "Polyethylene")
 PARTICLE = ("gamma", "electron", "muon", "neutron", "proton")
 
+# Schema of the database, built once and shared by every Database.
+# Enumerate types for particles and materials
+_PARTICLE_ENUM = ENUM("gamma", "electron", "muon",
+                      "neutron", "proton", name="particle_enum")
+_MATERIAL_ENUM = ENUM("Pb", "Fe", "W",
+                      "Polyethylene", "0", name="material_enum")
+
+_META = MetaData()
+
+_CONFIG = Table(
+    "config",
+    _META,
+    Column("id", Integer, primary_key=True),
+    Column("fk_p1", Integer, nullable=False),
+    Column("fk_p2", Integer, nullable=False),
+    Column("fk_p3", Integer, nullable=False),
+    Column("fk_p4", Integer, nullable=False),
+    Column("z_p1", Float, nullable=False),
+    Column("z_p2", Float, nullable=False),
+    Column("z_p3", Float, nullable=False),
+    Column("z_p4", Float, nullable=False),
+    ForeignKeyConstraint(["fk_p1"], ["plane.id"], ondelete="CASCADE"),
+    ForeignKeyConstraint(["fk_p2"], ["plane.id"], ondelete="CASCADE"),
+    ForeignKeyConstraint(["fk_p3"], ["plane.id"], ondelete="CASCADE"),
+    ForeignKeyConstraint(["fk_p4"], ["plane.id"], ondelete="CASCADE"),
+    UniqueConstraint("fk_p1", "fk_p2", "fk_p3", "fk_p4",
+                     name="config_uniqueness",
+                     postgresql_nulls_not_distinct=True)
+)
+
+_PLANE = Table(
+    "plane",
+    _META,
+    Column("id", Integer, primary_key=True),
+    Column("size_x", Float, nullable=False),
+    Column("size_y", Float, nullable=False),
+    Column("size_z", Float, nullable=False),
+    Column("abs_z", Float, nullable=True),              # 0 = NULL
+    Column("abs_mat", _MATERIAL_ENUM, nullable=True),   # "0" = NULL
+    Column("abs_thick", Float, nullable=True),          # 0 = NULL
+    UniqueConstraint("size_x", "size_y", "size_z", "abs_z",
+                     "abs_mat", "abs_thick", name="plane_uniqueness",
+                     postgresql_nulls_not_distinct=True)
+)
+
+_EVENT = Table(
+    "event",
+    _META,
+    Column("id", Integer, primary_key=True),
+    Column("fk_config", Integer),
+    Column("particle", _PARTICLE_ENUM, nullable=False),
+    Column("e_0", Float, nullable=False),
+    Column("theta", Float, nullable=False),
+    Column("phi", Float, nullable=False),
+    Column("n_hits", Integer, nullable=False),
+    ForeignKeyConstraint(
+        ["fk_config"], ["config.id"], ondelete="CASCADE"),
+    # PostgreSQL does not index foreign keys by itself. Needed by the joins
+    # of the analysis and by cascading deletes
+    Index("ix_event_config", "fk_config")
+)
+
+_HIT = Table(
+    "hit",
+    _META,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("fk_event", Integer),
+    Column("plane", Integer, nullable=False),
+    Column("x", Float, nullable=True),
+    Column("y", Float, nullable=True),
+    Column("z", Float, nullable=True),
+    Column("t", Float, nullable=True),
+    ForeignKeyConstraint(
+        ["fk_event"], ["event.id"], ondelete="CASCADE"),
+    Index("ix_hit_event_plane", "fk_event", "plane")
+)
+
+# Columns given on insertion, ids are assigned by the database
+_plane_columns = [column for column in _PLANE.c if column.name != "id"]
+_config_columns = [column for column in _CONFIG.c if column.name != "id"]
+_hit_columns = [column for column in _HIT.c if column.name != "id"]
+
+# Statements used to insert and look up planes and configurations. Values
+# are given as parameters on execution
+_PLANE_INSERT = (insert(_PLANE)
+                 .on_conflict_do_nothing()
+                 .returning(_PLANE.c.id, *_plane_columns))
+_CONFIG_INSERT = (insert(_CONFIG)
+                  .on_conflict_do_nothing()
+                  .returning(_CONFIG.c.id))
+
+_CONFIG_SELECT = select(_CONFIG).where(
+    *(_CONFIG.c[f"fk_p{idx}"] == bindparam(f"fk_p{idx}")
+      for idx in range(1, 5))
+)
+
+# NULL values of the plane have to match too
+_PLANE_ID_SELECT = select(_PLANE.c.id).where(
+    *(column.is_not_distinct_from(bindparam(column.name))
+      for column in _plane_columns)
+)
+_CONFIG_ID_SELECT = select(_CONFIG.c.id).where(
+    *(column == bindparam(column.name) for column in _config_columns)
+)
+
 
 @dataclass(frozen=True)
 class DBInput:
@@ -130,10 +253,36 @@ class Database:
 
     def __init__(self, data: DBInput, ask_to_create: bool = True) -> None:
 
+        # Connection data, needed by the processes that fill the database
+        self._data = data
+
         # Create database engine
         _url = URL.create(data.drivername, data.username,
                           data.password, data.host, data.port, data.database)
-        self.engine = create_engine(_url, echo=False)
+
+        # Batch executemany calls into multi-row statements with psycopg2
+        _kwargs: dict[str, str | int] = {}
+        if _url.get_driver_name() == "psycopg2":
+            _kwargs = {"executemany_mode": "values_plus_batch",
+                       "insertmanyvalues_page_size": 1000,
+                       "executemany_batch_page_size": 500}
+
+        # Pooled connections are checked before use and renewed hourly, so
+        # a long-lived instance does not fail on a connection closed by
+        # the server between fills
+        self.engine = create_engine(_url, echo=False, pool_pre_ping=True,
+                                    pool_recycle=3600, **_kwargs)
+
+        # Ids of the planes and configurations known to be in the database
+        self._plane_cache: dict[tuple[float | str | None, ...], int] = {}
+        self._config_cache: dict[tuple[int | float, ...], int] = {}
+
+        # Position (tell cookie) of the end of the header of the last
+        # data-file read
+        self._header_end: int | None = None
+
+        # Whether the database exists, checked once instead of per file
+        self._exists: bool = False
 
         # Load or create database
         if sqlutils.database_exists(self.engine.url):
@@ -152,7 +301,7 @@ class Database:
         return None
 
     def _make_meta(self, create: bool = True) -> None:
-        """Create MetaData and Table objects for database
+        """Set up MetaData and Table objects for database
 
         :param create: Whether to create a new database
         :return None:
@@ -168,78 +317,14 @@ class Database:
                     "incorrect username, password, host, drivers..."
                 ) from None
         assert sqlutils.database_exists(self.engine.url)
+        self._exists = True
 
-        # Define enumerate types for particles and materials
-        _particle_enum = ENUM("gamma", "electron", "muon",
-                              "neutron", "proton", name="particle_enum")
-        _material_enum = ENUM("Pb", "Fe", "W",
-                              "Polyethylene", "0", name="material_enum")
-
-        self.meta = MetaData()
-
-        self.config = Table(
-            "config",
-            self.meta,
-            Column("id", Integer, primary_key=True),
-            Column("fk_p1", Integer, nullable=False),
-            Column("fk_p2", Integer, nullable=False),
-            Column("fk_p3", Integer, nullable=False),
-            Column("fk_p4", Integer, nullable=False),
-            Column("z_p1", Float, nullable=False),
-            Column("z_p2", Float, nullable=False),
-            Column("z_p3", Float, nullable=False),
-            Column("z_p4", Float, nullable=False),
-            ForeignKeyConstraint(["fk_p1"], ["plane.id"], ondelete="CASCADE"),
-            ForeignKeyConstraint(["fk_p2"], ["plane.id"], ondelete="CASCADE"),
-            ForeignKeyConstraint(["fk_p3"], ["plane.id"], ondelete="CASCADE"),
-            ForeignKeyConstraint(["fk_p4"], ["plane.id"], ondelete="CASCADE"),
-            UniqueConstraint("fk_p1", "fk_p2", "fk_p3", "fk_p4",
-                             name="config_uniqueness",
-                             postgresql_nulls_not_distinct=True)
-        )
-
-        self.plane = Table(
-            "plane",
-            self.meta,
-            Column("id", Integer, primary_key=True),
-            Column("size_x", Float, nullable=False),
-            Column("size_y", Float, nullable=False),
-            Column("size_z", Float, nullable=False),
-            Column("abs_z", Float, nullable=True),              # 0 = NULL
-            Column("abs_mat", _material_enum, nullable=True),   # "0" = NULL
-            Column("abs_thick", Float, nullable=True),          # 0 = NULL
-            UniqueConstraint("size_x", "size_y", "size_z", "abs_z",
-                             "abs_mat", "abs_thick", name="plane_uniqueness",
-                             postgresql_nulls_not_distinct=True)
-        )
-
-        self.event = Table(
-            "event",
-            self.meta,
-            Column("id", Integer, primary_key=True),
-            Column("fk_config", Integer),
-            Column("particle", _particle_enum, nullable=False),
-            Column("e_0", Float, nullable=False),
-            Column("theta", Float, nullable=False),
-            Column("phi", Float, nullable=False),
-            Column("n_hits", Integer, nullable=False),
-            ForeignKeyConstraint(
-                ["fk_config"], ["config.id"], ondelete="CASCADE")
-        )
-
-        self.hit = Table(
-            "hit",
-            self.meta,
-            Column("id", Integer, primary_key=True, autoincrement=True),
-            Column("fk_event", Integer),
-            Column("plane", Integer, nullable=False),
-            Column("x", Float, nullable=True),
-            Column("y", Float, nullable=True),
-            Column("z", Float, nullable=True),
-            Column("t", Float, nullable=True),
-            ForeignKeyConstraint(
-                ["fk_event"], ["event.id"], ondelete="CASCADE")
-        )
+        # Schema objects are shared by every instance
+        self.meta = _META
+        self.config = _CONFIG
+        self.plane = _PLANE
+        self.event = _EVENT
+        self.hit = _HIT
 
         if create:
             self.meta.create_all(self.engine, checkfirst=True)
@@ -250,24 +335,52 @@ class Database:
             self, sources: str | Path | Iterable[str | Path]) -> list[Path]:
         """Turn any valid input for fill into a list of paths to data files"""
 
-        def __add_source(source: Path, source_list: list[Path]) -> list[Path]:
-            """Get paths to data-files from input and add them to list"""
+        def __is_data_file(source: Path) -> bool:
+            """Check the format of a file from its first bytes"""
+
+            fd = os.open(source, os.O_RDONLY)
+            try:
+                first = os.read(fd, 8)
+            finally:
+                os.close(fd)
+
+            # Files with Windows line endings are valid too
+            return first.replace(b"\r\n", b"\n")[:7] == b"HEADER\n"
+
+        def __add_dir(source: Path, source_list: list[Path]) -> list[Path]:
+            """Add the data-files in a directory tree to list"""
+
+            # Sort the entries so that files are always read in the same order
+            with os.scandir(source) as entries:
+                _entries = sorted(entries, key=lambda entry: entry.name)
+
+            for entry in _entries:
+                source_list = __add_source(entry, source_list)
+
+            return source_list
+
+        def __add_source(source: Path | os.DirEntry[str],
+                         source_list: list[Path]) -> list[Path]:
+            """Get paths to data-files from input and add them to list
+
+            Entries of scandir already know their type, so no extra stat call
+            is needed for them
+            """
+
+            _source = Path(source)
 
             # Coarse filter for undesired files
-            if source.suffix not in VALID_EXTENSIONS:
+            if _source.suffix not in VALID_EXTENSIONS:
                 return source_list
 
             if source.is_file():
                 # Check format and add to list
-                with source.open() as file:
-                    if file.readline() == "HEADER\n":
-                        source_list.append(source)
+                if __is_data_file(_source):
+                    source_list.append(_source)
             elif source.is_dir():
-                # Iterate over items in dir and add them to list
-                for _source in source.iterdir():
-                    __add_source(_source, source_list)
+                source_list = __add_dir(_source, source_list)
             else:
-                raise ValueError(f"Invalid input: {source}")
+                raise ValueError(f"Invalid input: {_source}")
 
             return source_list
 
@@ -295,110 +408,227 @@ class Database:
         :param source: Path to source file
         """
 
+        # Imported here so that pandas is only loaded when filling
+        import pandas as pd
+
+        def __read_data(source: TextIO) -> Iterator["pd.DataFrame"]:
+            """Read events (8 columns) and hits (5 columns) in chunks"""
+
+            try:
+                yield from pd.read_csv(source, sep="\t", header=None,
+                                       names=range(8), index_col=False,
+                                       dtype=float, engine="c",
+                                       chunksize=CHUNK_LINES,
+                                       float_precision="round_trip",
+                                       skip_blank_lines=False)
+            except pd.errors.EmptyDataError:
+                return None
+            except (pd.errors.ParserError, ValueError) as err:
+                raise DataFileFormatError(
+                    f"Unexpected format in data section of {source_file}"
+                ) from err
+
         # Ensure that database exists before proceeding
-        if not sqlutils.database_exists(self.engine.url):
+        if not self._exists:
             raise FileNotFoundError(
                 f"Database '{self.engine.url.database}' not found"
             )
 
-        with open(source_file, "r") as source:
+        # Everything in the file is inserted in a single transaction
+        with open(source_file, "r", buffering=READ_BUFFER_SIZE) as source, \
+                self._begin() as conn:
 
-            # Jump to data section
-            for _ in range(HEADER_LINES):
-                source.readline()
-            if not source.readline() == "DATA\n":
+            # Source files are read once from start to end
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(source.fileno(), 0, 0,
+                                 os.POSIX_FADV_SEQUENTIAL)
+
+            particle, config_id = self._read_setup(conn, source, source_file)
+
+            # Pandas rejects lines with extra fields, except the first one,
+            # whose fields would be dropped. Check that one by hand
+            start = source.tell()
+            if source.readline().count("\t") > 7:
                 raise DataFileFormatError(
-                    f"Unexpected header in source file '{source_file.name}'"
+                    f"Unexpected format in line {2 + HEADER_LINES} of "
+                    f"{source_file}"
                 )
+            source.seek(start)
 
-            # Read case and plane data from source file
-            config_data = source.readline()[:-1].split("\t")
-            active_plane_data = source.readline()[:-1].split("\t")
-            passive_plane_data = source.readline()[:-1].split("\t")
+            # Values shared by all the events of the file are written in the
+            # statement once instead of being sent with every row
+            event_insert = insert(self.event).values(
+                fk_config=literal_column(str(config_id)),
+                particle=literal(particle, self.event.c.particle.type)
+            ).returning(self.event.c.id, sort_by_parameter_order=True)
 
-            # Get particle type
-            if config_data[0] == "null":
-                particle = None
-            else:
-                particle = PARTICLE[int(config_data[0])]
+            # Id of the last inserted event. Hits at the beginning of a
+            # chunk belong to the last event of the previous one
+            event_id: int | None = None
+
+            for data in __read_data(source):
+
+                is_event = data.notna().all(axis=1).to_numpy()
+                is_hit = (data.iloc[:, :5].notna().all(axis=1)
+                          & data.iloc[:, 5:].isna().all(axis=1)).to_numpy()
+
+                # Position of the event each line belongs to
+                event_pos = is_event.cumsum() - 1
+
+                invalid = ~(is_event | is_hit)
+                if event_id is None:
+                    invalid |= is_hit & (event_pos < 0)
+                if invalid.any():
+                    line = data.index[invalid.argmax()]
+                    raise DataFileFormatError(
+                        "Unexpected format in line "
+                        f"{line + 2 + HEADER_LINES} of {source_file}"
+                    )
+
+                event_list = pd.DataFrame({
+                    "e_0": data.loc[is_event, 1],
+                    "theta": data.loc[is_event, 5],
+                    "phi": data.loc[is_event, 6],
+                    "n_hits": data.loc[is_event, 7].astype(int)
+                }).to_dict(orient="records")
+
+                hits = data.loc[is_hit, :4].set_axis(
+                    ["plane", "x", "y", "z", "t"], axis=1
+                ).astype({"plane": int})
+
+                # Event ids are assigned by the database
+                event_ids = conn.scalars(
+                    event_insert, event_list
+                ).all() if event_list else []
 
-            # Get plane dimensions
-            size_x: float = float(config_data[7])
-            size_y: float = float(config_data[8])
-            size_z: float = float(config_data[9])
+                hits.insert(0, "fk_event", pd.Series(
+                    [event_id or 0, *event_ids], dtype=int
+                ).take(event_pos[is_hit] + 1).to_numpy())
+                self._copy_hits(conn, hits)
 
-            # Insert planes
-            plane_values: list[dict[str, str | float | None]] = []
+                if event_ids:
+                    event_id = event_ids[-1]
 
+        return None
+
+    def _read_setup(self, conn: Connection, source: TextIO,
+                    source_file: Path) -> tuple[str, int]:
+        """Read the header of a data-file and insert its planes and config
+
+        :param conn: Connection whose transaction is used for the inserts
+        :param source: Data-file opened in text mode, at its beginning. It is
+        left at the beginning of the events
+        :param source_file: Path to the data-file, used in error messages
+        :return: Particle of the events in the file and id of their config
+        """
+
+        # Jump to data section. Headers usually have the same length in
+        # every file, try to skip it at once before reading it by lines.
+        # Positions of text files are opaque, only seek to those from tell
+        if self._header_end is not None:
+            source.seek(self._header_end)
+        if self._header_end is None or source.readline() != "DATA\n":
+            source.seek(0)
+            for _ in range(HEADER_LINES):
+                source.readline()
+            self._header_end = source.tell()
+            if not source.readline() == "DATA\n":
+                raise DataFileFormatError(
+                    "Unexpected header in source file "
+                    f"'{source_file.name}'"
+                )
+
+        # Read case and plane data from source file
+        config_data = source.readline()[:-1].split("\t")
+        active_plane_data = source.readline()[:-1].split("\t")
+        passive_plane_data = source.readline()[:-1].split("\t")
+
+        # Get particle type, events can not be stored without it
+        if config_data[0] == "null":
+            raise DataFileFormatError(
+                f"Missing particle type in source file '{source_file.name}'"
+            )
+        particle = PARTICLE[int(config_data[0])]
+
+        # Get plane dimensions, shared by the four planes
+        size: dict[str, str | float | None] = {
+            "size_x": float(config_data[7]),
+            "size_y": float(config_data[8]),
+            "size_z": float(config_data[9])
+        }
+
+        # Insert planes
+        plane_values: list[dict[str, str | float | None]] = [
+            {**size,
+             "abs_z": None if _a_z == "null" else float(_a_z),
+             "abs_mat": None if _a_m == "null" else MATERIAL[int(_a_m)],
+             "abs_thick": None if _a_t == "null" else float(_a_t)}
             for _a_z, _a_t, _a_m in zip(passive_plane_data[:4],
                                         passive_plane_data[4:8],
-                                        passive_plane_data[8:]):
+                                        passive_plane_data[8:])
+        ]
 
-                a_z = None if _a_z == "null" else float(_a_z)
-                a_t = None if _a_t == "null" else float(_a_t)
-                a_m = None if _a_m == "null" else MATERIAL[int(_a_m)]
+        fk_p_list = self._insert_plane(conn, plane_values)
 
-                plane_values.append({"size_x": size_x,
-                                     "size_y": size_y,
-                                     "size_z": size_z,
-                                     "abs_z": a_z,
-                                     "abs_mat": a_m,
-                                     "abs_thick": a_t})
+        # Insert config
+        config_values = {"fk_p1": fk_p_list[0],
+                         "fk_p2": fk_p_list[1],
+                         "fk_p3": fk_p_list[2],
+                         "fk_p4": fk_p_list[3],
+                         "z_p1": float(active_plane_data[0]),
+                         "z_p2": float(active_plane_data[1]),
+                         "z_p3": float(active_plane_data[2]),
+                         "z_p4": float(active_plane_data[3])}
 
-            fk_p_list = self._insert_plane(plane_values)
+        config_id = self._insert_config(conn, config_values)
 
-            # Insert config
-            config_values = {"fk_p1": fk_p_list[0],
-                             "fk_p2": fk_p_list[1],
-                             "fk_p3": fk_p_list[2],
-                             "fk_p4": fk_p_list[3],
-                             "z_p1": float(active_plane_data[0]),
-                             "z_p2": float(active_plane_data[1]),
-                             "z_p3": float(active_plane_data[2]),
-                             "z_p4": float(active_plane_data[3])}
+        return particle, config_id
 
-            config_id = self._insert_config(config_values)
+    def _copy_hits(self, conn: Connection, rows: "pd.DataFrame") -> None:
+        """Bulk load rows into hit table using binary COPY instead of INSERT
 
-            with self.engine.connect() as conn:
-                # Get the id of the last event in the database
-                _event_id, = conn.scalars(select(func.max(self.event.c.id)))
-                event_id = _event_id if _event_id is not None else 0
-
-            # Insert events and values
-            event_list: list[Mapping[str, int | float | str | None]] = []
-            hit_list: list[Mapping[str, int | float | None]] = []
-            for idx, line in enumerate(source.readlines()):
-                data = line[: -1].split("\t")
-                size = len(data)
-                if size == 8:
-                    event_list.append({
-                        "fk_config": config_id,
-                        "particle": particle,
-                        "e_0": float(data[1]),
-                        "theta": float(data[5]),
-                        "phi": float(data[6]),
-                        "n_hits": float(data[7])
-                    })
-                    event_id += 1
-                elif size == 5:
-                    hit_list.append({
-                        "fk_event": event_id,
-                        "plane": int(data[0]),
-                        "x": float(data[1]),
-                        "y": float(data[2]),
-                        "z": float(data[3]),
-                        "t": float(data[4])
-                    })
-                else:
-                    raise DataFileFormatError(
-                        "Unexpected format in line "
-                        f"{idx + 2 + HEADER_LINES} of {source_file}"
-                    )
+        :param conn: Connection whose transaction is used for the load
+        :param rows: Values of the hits to insert, one column per field.
+        Values can not be null
+        """
 
-            with self.engine.connect() as conn:
-                conn.execute(insert(self.event), event_list)
-                conn.execute(insert(self.hit), hit_list)
-                conn.commit()
+        if rows.empty:
+            return None
+
+        # Binary format of COPY: number of fields of each row followed by the
+        # length and big-endian value of each field
+        fields: list[tuple[str, str]] = [("size", ">i2")]
+        for column in _hit_columns:
+            dtype = ">i4" if isinstance(column.type, Integer) else ">f8"
+            fields += [(f"{column.name}_len", ">i4"), (column.name, dtype)]
+        data = np.empty(len(rows), dtype=np.dtype(fields))
+
+        data["size"] = len(_hit_columns)
+        for column in _hit_columns:
+            data[f"{column.name}_len"] = data.dtype[column.name].itemsize
+            data[column.name] = rows[column.name].to_numpy()
+
+        buffer = io.BytesIO()
+        buffer.write(b"PGCOPY\n\xff\r\n\x00" + bytes(8))     # Header
+        buffer.write(data.tobytes())
+        buffer.write(b"\xff\xff")                              # Trailer
+        buffer.seek(0)
+
+        # COPY is only available through the psycopg2 connection
+        dbapi_conn = conn.connection.driver_connection
+        if dbapi_conn is None:
+            raise TypeError("Unexpected type for DBAPI connection"
+                            ". Expected connection, got None")
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {self.hit.name} "
+                f"({', '.join(column.name for column in _hit_columns)}) "
+                "FROM STDIN WITH (FORMAT BINARY)",
+                buffer
+            )
+        finally:
+            cursor.close()
 
         return None
 
@@ -408,16 +638,79 @@ class Database:
 
         return None
 
-    def fill(self, sources: str | Path | Iterable[str | Path]) -> None:
+    def fill(self, sources: str | Path | Iterable[str | Path],
+             max_workers: int = 1) -> None:
         """Fill database using data-files (API)
 
+        With more than one worker, data-files are filled by separate processes
+        started with the "spawn" method, so scripts calling this must guard
+        their entry point with ``if __name__ == "__main__":``. Planes and
+        configurations are still inserted in input order before the workers
+        start, but the ids of events and hits depend on the order in which
+        the processes finish and are not reproducible
+
         :param sources: Data files to be used to fill the database or path
         to the directory where they are contained
+        :param max_workers: Number of processes filling the database at once.
+        Defaults to filling the files one after the other in this process
         """
 
         # Take given input and turn it into a list of paths to data-files
         source_list = self._fill_input_handler(sources)
 
+        if not self._exists:
+            raise FileNotFoundError(
+                f"Database '{self.engine.url.database}' not found"
+            )
+
+        # Files usually share planes and configurations already in the database
+        self._load_caches()
+
+        max_workers = min(max_workers, len(source_list))
+
+        if max_workers <= 1:
+            self._fill_files(source_list)
+            return None
+
+        # Insert the planes and configurations of every file beforehand, so
+        # that processes only insert events and hits and never lock each other
+        with self._begin() as conn:
+            for source_file in source_list:
+                with open(source_file, "r") as source:
+                    self._read_setup(conn, source, source_file)
+
+        # Each process uses its own Database, engines can not be shared
+        with ProcessPoolExecutor(max_workers,
+                                 mp_context=get_context("spawn")) as executor:
+            futures = [executor.submit(_fill_files, self._data,
+                                       source_list[idx::max_workers])
+                       for idx in range(max_workers)]
+            for future in as_completed(futures):
+                future.result()
+
+        return None
+
+    def _load_caches(self) -> None:
+        """Cache the ids of all the planes and configurations in the database
+
+        :return None:
+        """
+
+        with self.engine.connect() as conn:
+            self._plane_cache.update({
+                tuple(row[1:]): row[0]
+                for row in conn.execute(select(self.plane))
+            })
+            self._config_cache.update({
+                tuple(row[1:]): row[0]
+                for row in conn.execute(select(self.config))
+            })
+
+        return None
+
+    def _fill_files(self, source_list: list[Path]) -> None:
+        """Fill database with the given data-files, one after the other"""
+
         for source in source_list:
             print(
                 f"Filling {self.engine.url.database} with {source.parent.name}"
@@ -433,6 +726,9 @@ class Database:
         if sqlutils.database_exists(self.engine.url):
             print(f"Dropping database: {self.engine.url.database}")
             sqlutils.drop_database(self.engine.url)
+            self._exists = False
+            self._plane_cache.clear()
+            self._config_cache.clear()
         else:
             raise FileNotFoundError(
                 f"Database '{self.engine.url.database}' not found"
@@ -440,74 +736,80 @@ class Database:
 
         return None
 
-    def _insert_plane(self,
+    @contextmanager
+    def _begin(self) -> Iterator[Connection]:
+        """Open a connection with a transaction that is committed on exit
+
+        Cached ids are discarded if the transaction is rolled back, as they
+        may belong to rows that were never committed
+        """
+
+        try:
+            with self.engine.begin() as conn:
+                yield conn
+        except BaseException:
+            self._plane_cache.clear()
+            self._config_cache.clear()
+            raise
+
+    def _insert_plane(self, conn: Connection,
                       data: list[dict[str, float | str | None]]) -> list[int]:
-        """Insert row into plane table"""
+        """Insert rows into plane table and get their ids in input order"""
+
+        # Keys follow the column order of the rows returned by _PLANE_INSERT
+        def __key(
+            row: Mapping[str, float | str | None]
+        ) -> tuple[float | str | None, ...]:
+            return tuple(row[column.name] for column in _plane_columns)
+
+        # Planes whose id is not known yet, without duplicates
+        missing = list({__key(row): row for row in data
+                        if __key(row) not in self._plane_cache}.values())
+
+        if missing:
+
+            # Insert all the planes at once, known planes are skipped
+            result = conn.execute(_PLANE_INSERT, missing)
+            ids = {tuple(row[1:]): row[0] for row in result}
+
+            # Get the ids of the planes that were already in the database
+            missing = [row for row in missing if __key(row) not in ids]
+            if missing:
+                result = conn.execute(
+                    select(self.plane.c.id, *_plane_columns)
+                    .where(or_(*(
+                        and_(*(column == row[column.name]
+                               for column in _plane_columns))
+                        for row in missing
+                    )))
+                )
+                ids.update({tuple(row[1:]): row[0] for row in result})
 
-        fk_p_list: list[int] = []
+            self._plane_cache.update(ids)
 
-        with self.engine.connect() as conn:
+        return [self._plane_cache[__key(row)] for row in data]
 
-            for row in data:
-
-                # Return id if insert succeeds, None otherwise
-                _id = conn.scalar(insert(self.plane)
-                                  .values(row)
-                                  .on_conflict_do_nothing()
-                                  .returning(self.plane.c.id))
-
-                if isinstance(_id, int):
-                    id = _id
-                elif _id is None:
-                    tmp_id = conn.scalars(
-                        select(self.plane.c.id)
-                        .where(
-                            self.plane.c.size_x == row["size_x"],
-                            self.plane.c.size_y == row["size_y"],
-                            self.plane.c.size_z == row["size_z"],
-                            self.plane.c.abs_z == row["abs_z"],
-                            self.plane.c.abs_mat == row["abs_mat"],
-                            self.plane.c.abs_thick == row["abs_thick"]
-                        )
-                    ).fetchall()
-                    id, = tmp_id
-                else:       # Unexpected result
-                    raise TypeError("Unexpected type for plane id. "
-                                    f"Expected int or None, got {type(_id)}")
-
-                fk_p_list.append(id)
-
-                conn.commit()
-
-        return fk_p_list
-
-    def _insert_config(self, data: dict[str, int | float]) -> int:
+    def _insert_config(self, conn: Connection,
+                       data: dict[str, int | float]) -> int:
         """Insert row into config table"""
 
-        with self.engine.connect() as conn:
+        key = tuple(data[column.name] for column in _config_columns)
+        if key in self._config_cache:
+            return self._config_cache[key]
 
-            _id = conn.scalar(insert(self.config)
-                              .values(data)
-                              .on_conflict_do_nothing()
-                              .returning(self.config.c.id))
-
-            if isinstance(_id, int):
-                config_id = _id
-            elif _id is None:
-                config_id, = conn.scalars(
-                    select(self.config.c.id)
-                    .where(
-                        self.config.c.fk_p1 == data["fk_p1"],
-                        self.config.c.fk_p2 == data["fk_p2"],
-                        self.config.c.fk_p3 == data["fk_p3"],
-                        self.config.c.fk_p4 == data["fk_p4"]
-                    )
-                )
-            else:       # Unexpected result
-                raise TypeError("Unexpected type for config id"
-                                f". Expected int or None, got {type(_id)}")
+        _id = conn.scalar(_CONFIG_INSERT, data)
 
-            conn.commit()
+        if isinstance(_id, int):
+            config_id = _id
+        elif _id is None:
+            # Cache the stored values, z coordinates may differ
+            (config_id, *values), = conn.execute(_CONFIG_SELECT, data)
+            key = tuple(values)
+        else:       # Unexpected result
+            raise TypeError("Unexpected type for config id"
+                            f". Expected int or None, got {type(_id)}")
+
+        self._config_cache[key] = config_id
 
         return config_id
 
@@ -523,14 +825,18 @@ class Database:
             values = [values]
         _values = [asdict(value) for value in values]
 
-        # Insert planes and get their ids
-        ids = self._insert_plane(_values)
+        with self._begin() as conn:
 
-        # Get all the data from the inserted planes
-        with self.engine.connect() as conn:
-            return [conn.execute(select(self.plane)
-                                 .where(self.plane.c.id == id)).fetchone()
-                    for id in ids]
+            # Insert planes and get their ids
+            ids = self._insert_plane(conn, _values)
+
+            # Get all the data from the inserted planes
+            rows = conn.execute(select(self.plane)
+                                .where(self.plane.c.id.in_(ids))).fetchall()
+
+        by_id = {row.id: row for row in rows}
+
+        return [by_id[id] for id in ids]
 
     def insert_config(self, values: ConfigInput | Sequence[ConfigInput]):
         """Manually insert data into config table
@@ -544,14 +850,18 @@ class Database:
             values = [values]
         _values = [asdict(value) for value in values]
 
-        # Insert configurations and get their ids
-        ids = [self._insert_config(value) for value in _values]
+        with self._begin() as conn:
 
-        # Get all the data from the inserted configurations
-        with self.engine.connect() as conn:
-            return [conn.execute(select(self.config)
-                                 .where(self.config.c.id == id)).fetchone()
-                    for id in ids]
+            # Insert configurations and get their ids
+            ids = [self._insert_config(conn, value) for value in _values]
+
+            # Get all the data from the inserted configurations
+            rows = conn.execute(select(self.config)
+                                .where(self.config.c.id.in_(ids))).fetchall()
+
+        by_id = {row.id: row for row in rows}
+
+        return [by_id[id] for id in ids]
 
     def get_plane_id(self, plane: PlaneInput) -> int:
         """Get the id of the plane matching a given configuration
@@ -562,30 +872,57 @@ class Database:
         :return: ID of plane matching given configuration
         """
 
-        err_msg = "not enough values to unpack (expected 1, got 0)"
+        # Planes inserted or found before do not need a query
+        key = astuple(plane)
+        if key in self._plane_cache:
+            return self._plane_cache[key]
 
         with self.engine.connect() as conn:
-            try:
-                id, = conn.scalars(
-                    select(self.plane.c.id).where(
-                        self.plane.c.size_x == plane.size_x,
-                        self.plane.c.size_y == plane.size_y,
-                        self.plane.c.size_z == plane.size_z,
-                        self.plane.c.abs_z == plane.abs_z,
-                        self.plane.c.abs_mat == plane.abs_mat,
-                        self.plane.c.abs_thick == plane.abs_thick
-                    )
-                )
-                if not isinstance(id, int):
-                    raise TypeError("Unexpected type for plane id")
-            except ValueError as err:
-                if err.args[0] == err_msg:
-                    raise ValueError("Plane configuration not found")
-                else:
-                    raise err
+            id = conn.scalars(_PLANE_ID_SELECT, asdict(plane)).first()
+
+        if id is None:
+            raise ValueError("Plane configuration not found")
+        if not isinstance(id, int):
+            raise TypeError("Unexpected type for plane id")
+
+        self._plane_cache[key] = id
 
         return id
 
+    def get_plane_ids(self, planes: Sequence[PlaneInput]) -> list[int]:
+        """Get the ids of the planes matching several configurations at once
+
+        Raises ValueError if any of the given configurations is not found
+
+        :param planes: Configurations of the desired planes
+        :return: IDs of planes matching given configurations, in input order
+        """
+
+        keys = [astuple(plane) for plane in planes]
+
+        # Look up all the planes not found before in a single query
+        missing = list({key: plane for key, plane in zip(keys, planes)
+                        if key not in self._plane_cache}.values())
+
+        if missing:
+            with self.engine.connect() as conn:
+                result = conn.execute(
+                    select(self.plane.c.id, *_plane_columns)
+                    .where(or_(*(
+                        and_(*(column == getattr(plane, column.name)
+                               for column in _plane_columns))
+                        for plane in missing
+                    )))
+                )
+                self._plane_cache.update(
+                    {tuple(row[1:]): row[0] for row in result}
+                )
+
+        if any(key not in self._plane_cache for key in keys):
+            raise ValueError("Plane configuration not found")
+
+        return [self._plane_cache[key] for key in keys]
+
     def get_config_id(self, config: ConfigInput) -> int:
         """
         Get the id of the detector matching a given configuration
@@ -596,28 +933,33 @@ class Database:
         :return: ID of detector matching given configuration
         """
 
-        err_msg = "not enough values to unpack (expected 1, got 0)"
+        # Configurations inserted or found before do not need a query
+        key = astuple(config)
+        if key in self._config_cache:
+            return self._config_cache[key]
 
         with self.engine.connect() as conn:
-            try:
-                id, = conn.scalars(
-                    select(self.config.c.id).where(
-                        self.config.c.fk_p1 == config.fk_p1,
-                        self.config.c.fk_p2 == config.fk_p2,
-                        self.config.c.fk_p3 == config.fk_p3,
-                        self.config.c.fk_p4 == config.fk_p4,
-                        self.config.c.z_p1 == config.z_p1,
-                        self.config.c.z_p2 == config.z_p2,
-                        self.config.c.z_p3 == config.z_p3,
-                        self.config.c.z_p4 == config.z_p4
-                    )
-                )
-                if not isinstance(id, int):
-                    raise TypeError("Unexpected type for config id")
-            except ValueError as err:
-                if err.args[0] == err_msg:
-                    raise ValueError("Detector configuration not found")
-                else:
-                    raise err
+            id = conn.scalars(_CONFIG_ID_SELECT, asdict(config)).first()
+
+        if id is None:
+            raise ValueError("Detector configuration not found")
+        if not isinstance(id, int):
+            raise TypeError("Unexpected type for config id")
+
+        self._config_cache[key] = id
 
         return id
+
+
+def _fill_files(data: DBInput, source_list: list[Path]) -> None:
+    """Fill a database with data-files from a worker process
+
+    :param data: User and host information to access database
+    :param source_list: Paths to the data-files
+    """
+
+    db = Database(data, ask_to_create=False)
+    db._load_caches()
+    db._fill_files(source_list)
+
+    return None
@@ -9,8 +9,8 @@ from typing import Union, Iterable
 DEFAULT_INPUT = DBInput("mock_database", username="carol")
 
 # DATA FOR MOCK SOURCE FILES
-MOCK_SOURCE_DATA = {
-    "10-16-800": """HEADER
+# Header shared by all the mock data-files
+MOCK_HEADER = """HEADER
     CASE
         Particle []: gamma (0), electron (1), muon (2), neutron (3), proton (4)
         Number of events []:
@@ -55,7 +55,10 @@ MOCK_SOURCE_DATA = {
         Y [mm]: Measured from center of plane, right handed frame
         Z [mm]: Measured downwards from first active plane
         Time since first impact [ns]:
-DATA
+"""
+
+MOCK_SOURCE_DATA = {
+    "10-16-800": MOCK_HEADER + """DATA
 1	10000	800	800	0	0	0	999	999	22
 0	100	200	400
 null	22	null	222	null	10.4	null	16.2	null	0	null	0
@@ -189,52 +192,7 @@ null	22	null	222	null	10.4	null	16.2	null	0	null	0
 2	-2.0470e+01	-6.4170e+00	+1.0000e+02	0.3793
 3	-6.1500e+01	+9.4380e+00	+2.0000e+02	0.7458
 """,
-    "10-16-1000": """HEADER
-    CASE
-        Particle []: gamma (0), electron (1), muon (2), neutron (3), proton (4)
-        Number of events []:
-        Emin [MeV]:
-        Emax [MeV]:
-        E distribution: constant (0), gaussian (1), exponential (2)
-        Theta min [deg]:
-        Theta max [deg]:
-        Detector plane - X dimension [mm]:
-        Detector plane - Y dimension [mm]:
-        Detector plane - Z dimension [mm]:
-    ACTIVE PLANES
-        Plane 1 - Z coordinate [mm]: 0 by definition
-        Plane 2 - Z coordinate [mm]:
-        Plane 3 - Z coordinate [mm]:
-        Plane 4 - Z coordinate [mm]:
-    PASSIVE PLANES
-        Plane 1 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 2 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 3 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 4 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 1 - Thickness [mm]:
-        Plane 2 - Thickness [mm]:
-        Plane 3 - Thickness [mm]:
-        Plane 4 - Thickness [mm]:
-        Plane 1 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 2 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 3 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 4 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-   EVENT
-        Event number []:
-        Initial energy [MeV]:
-        Initial X [mm]: Measured from center of plane, positive to the right
-        Initial Y [mm]: Measured from center of plane, right handed frame
-        Initial Z [mm]: 0 by definition
-        Initial theta [deg]:
-        Initial phi [deg]:
-        Number of hits []:
-    HIT
-        Plane number []: First is 1, last is 4
-        X [mm]: Measured from center of plane, positive to the right
-        Y [mm]: Measured from center of plane, right handed frame
-        Z [mm]: Measured downwards from first active plane
-        Time since first impact [ns]:
-DATA
+    "10-16-1000": MOCK_HEADER + """DATA
 1	10000	1000	1000	0	0	0	999	999	22
 0	100	200	400
 null	22	null	222	null	10.4	null	16.2	null	0	null	0
@@ -440,52 +398,7 @@ null	22	null	222	null	10.4	null	16.2	null	0	null	0
 3	-1.1580e+02	+4.6420e+02	+2.0380e+02	2.104
 2	-1.7280e+02	+1.1250e+02	+1.1770e+02	0.8817
 """,
-    "16-10-800": """HEADER
-    CASE
-        Particle []: gamma (0), electron (1), muon (2), neutron (3), proton (4)
-        Number of events []:
-        Emin [MeV]:
-        Emax [MeV]:
-        E distribution: constant (0), gaussian (1), exponential (2)
-        Theta min [deg]:
-        Theta max [deg]:
-        Detector plane - X dimension [mm]:
-        Detector plane - Y dimension [mm]:
-        Detector plane - Z dimension [mm]:
-    ACTIVE PLANES
-        Plane 1 - Z coordinate [mm]: 0 by definition
-        Plane 2 - Z coordinate [mm]:
-        Plane 3 - Z coordinate [mm]:
-        Plane 4 - Z coordinate [mm]:
-    PASSIVE PLANES
-        Plane 1 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 2 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 3 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 4 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 1 - Thickness [mm]:
-        Plane 2 - Thickness [mm]:
-        Plane 3 - Thickness [mm]:
-        Plane 4 - Thickness [mm]:
-        Plane 1 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 2 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 3 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 4 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-   EVENT
-        Event number []:
-        Initial energy [MeV]:
-        Initial X [mm]: Measured from center of plane, positive to the right
-        Initial Y [mm]: Measured from center of plane, right handed frame
-        Initial Z [mm]: 0 by definition
-        Initial theta [deg]:
-        Initial phi [deg]:
-        Number of hits []:
-    HIT
-        Plane number []: First is 1, last is 4
-        X [mm]: Measured from center of plane, positive to the right
-        Y [mm]: Measured from center of plane, right handed frame
-        Z [mm]: Measured downwards from first active plane
-        Time since first impact [ns]:
-DATA
+    "16-10-800": MOCK_HEADER + """DATA
 1	10000	800	800	0	0	0	999	999	22
 0	100	200	400
 null	22	null	222	null	16.2	null	10.4	null	0	null	0
@@ -642,52 +555,7 @@ null	22	null	222	null	16.2	null	10.4	null	0	null	0
 4	+5.3510e+01	-6.5070e+01	+4.0690e+02	1.491
 4	+4.9790e+01	+5.6310e+01	+4.0000e+02	1.42
 """,
-    "16-10-1000": """HEADER
-    CASE
-        Particle []: gamma (0), electron (1), muon (2), neutron (3), proton (4)
-        Number of events []:
-        Emin [MeV]:
-        Emax [MeV]:
-        E distribution: constant (0), gaussian (1), exponential (2)
-        Theta min [deg]:
-        Theta max [deg]:
-        Detector plane - X dimension [mm]:
-        Detector plane - Y dimension [mm]:
-        Detector plane - Z dimension [mm]:
-    ACTIVE PLANES
-        Plane 1 - Z coordinate [mm]: 0 by definition
-        Plane 2 - Z coordinate [mm]:
-        Plane 3 - Z coordinate [mm]:
-        Plane 4 - Z coordinate [mm]:
-    PASSIVE PLANES
-        Plane 1 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 2 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 3 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 4 - Z coordinate [mm]: Measured downwards from first active plane
-        Plane 1 - Thickness [mm]:
-        Plane 2 - Thickness [mm]:
-        Plane 3 - Thickness [mm]:
-        Plane 4 - Thickness [mm]:
-        Plane 1 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 2 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 3 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-        Plane 4 - Material []: Pb (0), Fe (1), W (2), Polyethylene (3)
-   EVENT
-        Event number []:
-        Initial energy [MeV]:
-        Initial X [mm]: Measured from center of plane, positive to the right
-        Initial Y [mm]: Measured from center of plane, right handed frame
-        Initial Z [mm]: 0 by definition
-        Initial theta [deg]:
-        Initial phi [deg]:
-        Number of hits []:
-    HIT
-        Plane number []: First is 1, last is 4
-        X [mm]: Measured from center of plane, positive to the right
-        Y [mm]: Measured from center of plane, right handed frame
-        Z [mm]: Measured downwards from first active plane
-        Time since first impact [ns]:
-DATA
+    "16-10-1000": MOCK_HEADER + """DATA
 1	10000	1000	1000	0	0	0	999	999	22
 0	100	200	400
 null	22	null	222	null	16.2	null	10.4	null	0	null	0
@@ -894,7 +762,7 @@ def make_sources(
 
 
 @pytest.fixture()
-def make_mock_source(request):
+def make_mock_source(request, tmp_path: Path):
     """
     Create a temporary source file for testing.
     The content of the file is passed using the @pytest.mark.fixt_data
@@ -905,8 +773,7 @@ def make_mock_source(request):
         raise ValueError("Missing content for mock source file")
     else:
         content = marker.args[0]
-    tmp = get_tmp()
-    source_file = Path(tmp, "mock_source.txt")
+    # Each test gets its own directory, removed by pytest
+    source_file = tmp_path / "mock_source.txt"
     source_file.write_text(content)
-    yield source_file
-    source_file.unlink()
+    return source_file
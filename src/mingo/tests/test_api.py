@@ -1,17 +1,19 @@
 import pytest
-from tempfile import gettempdir
-from platform import system
 from pathlib import Path
 from mingo.tests.mock_data import MOCK_SOURCE_DATA, DEFAULT_INPUT
 from mingo import (Database, Hit_distribution,
                    Shower_depth, Scattering, Plane_hits)
 import pandas as pd
+import numpy as np
+from sqlalchemy import Float, Subquery, cast, column, select, values
+from sqlalchemy.exc import DataError
+from mingo.analysis import _hist_stats
 
 
 @pytest.fixture(scope="module")
-def make_sources():
+def make_sources(tmp_path_factory: pytest.TempPathFactory):
 
-    tmp = Path("/tmp") if system() == "Darwin" else Path(gettempdir())
+    tmp = tmp_path_factory.mktemp("sources")
 
     sources: list[Path] = []
 
@@ -46,9 +48,9 @@ def make_database(make_sources: list[Path]):
     "params", [
         (1, 999, 999, 22, None, None, None),
         (2, 999, 999, 22, 22, "Pb", 10.4),
-        (4, 999, 999, 22, 222, "Pb", 16.2),
-        (10, 999, 999, 22, 22, "Pb", 16.2),
-        (12, 999, 999, 22, 222, "Pb", 10.4),
+        (3, 999, 999, 22, 222, "Pb", 16.2),
+        (4, 999, 999, 22, 22, "Pb", 16.2),
+        (5, 999, 999, 22, 222, "Pb", 10.4),
         (None, 0, 0, 0, None, None, None)
     ]
 )
@@ -71,8 +73,8 @@ def test_get_plane_id(make_database: Database, params) -> None:
 
 @pytest.mark.parametrize(
     "params", [
-        (1, (1, 2, 1, 4), (0, 100, 200, 400)),
-        (3, (1, 10, 1, 12), (0, 100, 200, 400)),
+        (1, (1, 2, 1, 3), (0, 100, 200, 400)),
+        (2, (1, 4, 1, 5), (0, 100, 200, 400)),
         (None, (1, 2, 1, 1), (0, 100, 200, 400)),
         (None, (1, 2, 1, 3), (0, 100, 200, 300))
     ]
@@ -96,13 +98,32 @@ def test_get_config_id(make_database: Database, params) -> None:
     return None
 
 
+def test_get_plane_ids(make_database: Database) -> None:
+    """Get several plane IDs from configuration data in a single query"""
+
+    # New instance, so that ids are not taken from the cache of the fill
+    db = Database(DEFAULT_INPUT)
+
+    planes = [db.PlaneInput(999, 999, 22, 222, "Pb", 16.2),
+              db.PlaneInput(999, 999, 22, None, None, None),
+              db.PlaneInput(999, 999, 22, 222, "Pb", 16.2)]
+
+    assert db.get_plane_ids(planes) == [3, 1, 3]
+    assert db.get_plane_ids([]) == []
+
+    with pytest.raises(ValueError):
+        db.get_plane_ids([*planes, db.PlaneInput(0, 0, 0, None, None, None)])
+
+    return None
+
+
 def test_hit_distribution(make_database: Database) -> None:
 
     db = make_database
 
     hits = Hit_distribution(db)
     hits(1, "1016")
-    hits(3, "1610")
+    hits(2, "1610")
 
     d10 = hits.dist_data["1016"]
     d16 = hits.dist_data["1610"]
@@ -117,6 +138,16 @@ def test_hit_distribution(make_database: Database) -> None:
     assert d16[800].tolist() == [[24, 32, 45, 47], [1, 1, 1, 1]]
     assert d16[1000].tolist() == [[27, 31, 38, 63], [1, 1, 1, 1]]
 
+    # Check tidy distribution table
+    h10 = hits.hist_data["1016"]
+    assert list(h10.columns) == ["e_0", "val", "count"]
+    assert h10["e_0"].tolist() == [800] * 4 + [1000] * 4
+    assert h10["val"].tolist() == [13, 24, 38, 50, 32, 42, 53, 70]
+
+    # Table and distributions are stored once
+    assert np.shares_memory(h10["val"].to_numpy(), d10[800])
+    assert np.shares_memory(h10["count"].to_numpy(), d10[1000])
+
     # Check stats data
     assert isinstance(s10, pd.DataFrame)
     assert isinstance(s16, pd.DataFrame)
@@ -142,7 +173,7 @@ def test_shower_depth(make_database: Database) -> None:
 
     depth = Shower_depth(db)
     depth(1, "1016")
-    depth(3, "1610")
+    depth(2, "1610")
 
     d10 = depth.dist_data["1016"]
     d16 = depth.dist_data["1610"]
@@ -182,7 +213,7 @@ def test_plane_hits(make_database: Database) -> None:
 
     hits = Plane_hits(db, 3)
     hits(1, "1016")
-    hits(3, "1610")
+    hits(2, "1610")
 
     d10 = hits.dist_data["1016"]
     d16 = hits.dist_data["1610"]
@@ -222,7 +253,7 @@ def test_scattering(make_database: Database) -> None:
 
     R = Scattering(db, 3)
     R(1, "1016")
-    R(3, "1610")
+    R(2, "1610")
 
     d10 = R.dist_data["1016"]
     d16 = R.dist_data["1610"]
@@ -254,3 +285,126 @@ def test_scattering(make_database: Database) -> None:
     assert s16["kurtosis"].tolist() == [1.43, 1.84]
 
     return None
+
+
+def test_cached_call(make_database: Database) -> None:
+    """Repeated calls for the same configuration reuse stored results"""
+
+    db = make_database
+
+    hits = Hit_distribution(db)
+    hits(1, "config")
+    dist, stats = hits.dist_data["config"], hits.stats_data["config"]
+
+    # Same configuration and label: data is not queried again
+    hits(1, "config")
+    assert hits.dist_data["config"] is dist
+    assert hits.stats_data["config"] is stats
+
+    # Invalidated configuration is queried again
+    hits.invalidate(1)
+    hits(1, "config")
+    assert hits.dist_data["config"] is not dist
+
+    # Different configuration under the same label replaces the data
+    hits(2, "config")
+    assert list(hits.dist_data["config"][800][0]) == [24, 32, 45, 47]
+
+    return None
+
+
+@pytest.mark.parametrize("cls", [Hit_distribution, Plane_hits])
+def test_stats_from_distribution(make_database: Database, cls) -> None:
+    """Stats derived from the distribution match those queried from SQL"""
+
+    db = make_database
+
+    obj = cls(db) if cls is Hit_distribution else cls(db, 3)
+    obj(1, "hist")
+    obj.stats(1, "sql")
+
+    pd.testing.assert_frame_equal(obj.stats_data["hist"],
+                                  obj.stats_data["sql"], check_dtype=False)
+
+    return None
+
+
+def test_stats_precision(make_database: Database) -> None:
+    """Stats keep their precision when the mean is much larger than std"""
+
+    db = make_database
+    val = 1e4 + np.array([0, 1, 1, 2, 2, 2, 3, 7])
+
+    class Wide(Hit_distribution):
+        def _stats_tmp(self, id: int, plane_num: int | None) -> Subquery:
+            data = values(column("e_0", Float), column("val", Float),
+                          name="data").data([(800, float(v)) for v in val])
+            # Double precision, like the columns of the database
+            _val = cast(data.c.val, Float).label("val")
+            return select(data.c.e_0, _val).subquery("tmp")
+
+    wide = Wide(db)
+    wide.stats(1, "wide")
+    result = wide.stats_data["wide"].iloc[0]
+
+    dev = val - val.mean()
+    assert result["std"] == pytest.approx(dev.std(), rel=1e-9)
+    assert result["skewness"] == pytest.approx(
+        (dev ** 3).mean() / dev.std() ** 3, rel=1e-9)
+    assert result["kurtosis"] == pytest.approx(
+        (dev ** 4).mean() / dev.std() ** 4, rel=1e-9)
+
+    return None
+
+
+def test_stats_single_value(make_database: Database) -> None:
+    """
+    Stats of an energy whose events share a single value fail both in the
+    database and when derived from the distribution
+    """
+
+    db = make_database
+
+    class Single(Hit_distribution):
+        def _stats_tmp(self, id: int, plane_num: int | None) -> Subquery:
+            data = values(column("e_0", Float), column("val", Float),
+                          name="data").data([(800, 3.0), (800, 3.0)])
+            return select(data).subquery("tmp")
+
+    with pytest.raises(DataError):
+        Single(db).stats(1, "single")
+
+    hist = pd.DataFrame({"e_0": [800.0, 1000.0, 1000.0],
+                         "val": [3, 1, 2], "count": [2, 1, 1]})
+    with pytest.raises(ZeroDivisionError):
+        _hist_stats(hist)
+
+    return None
+
+
+def test_empty_config(make_database: Database) -> None:
+    """Configurations without events produce empty results"""
+
+    db = make_database
+
+    depth = Shower_depth(db)
+    depth(99, "empty")
+
+    assert depth.dist_data["empty"] == {}
+    assert depth.stats_data["empty"].empty
+    assert list(depth.stats_data["empty"].columns) == [
+        "e_0", "avg", "std", "skewness", "kurtosis", "median", "avg / std"
+    ]
+
+    return None
+
+
+def test_exports() -> None:
+    """Every exported name can be loaded from the package root"""
+
+    import mingo
+
+    for name in mingo.__all__:
+        assert getattr(mingo, name) is not None
+
+    return None
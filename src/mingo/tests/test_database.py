@@ -1,10 +1,11 @@
 import pytest
 from pathlib import Path
-from platform import system
-from tempfile import gettempdir
 from mingo.tests.mock_data import MOCK_SOURCE_DATA, DEFAULT_INPUT
 from mingo import Database
-from sqlalchemy import MetaData, select
+from mingo.errors import DataFileFormatError
+from mingo.database import HEADER_LINES
+from typing import Any
+from sqlalchemy import MetaData, Row, select
 
 
 EXPECTED_TABLES = ["config", "plane", "event", "hit"]
@@ -17,8 +18,8 @@ EXPECTED_COLUMNS = {
     "hit": ["id", "fk_event", "plane", "x", "y", "z", "t"]
 }
 EXPECTED_CONFIG = [
-    (1, 1, 2, 1, 4, 0, 100, 200, 400),
-    (2, 1, 6, 1, 8, 0, 100, 200, 400)
+    (1, 1, 2, 1, 3, 0, 100, 200, 400),
+    (2, 1, 4, 1, 5, 0, 100, 200, 400)
 ]
 EXPECTED_PLANE = [
     (999, 999, 22, 22, "Pb", 10.4),
@@ -38,9 +39,10 @@ EXPECTED_HIT = [
 
 
 @pytest.fixture(scope="module")
-def make_sources():
+def make_sources(tmp_path_factory: pytest.TempPathFactory):
 
-    tmp = Path("/tmp") if system() == "Darwin" else Path(gettempdir())
+    # Directory of its own, as some tests fill the database with all of it
+    tmp = tmp_path_factory.mktemp("sources")
 
     key_list = list(MOCK_SOURCE_DATA.keys())
 
@@ -100,10 +102,13 @@ def check_database_content(db: Database) -> None:
 
     with db.engine.connect() as conn:
 
-        # Check data in config table
-        _data = conn.execute(select(db.config)).fetchall()
-        # Output is independent of input order, no need to re-arrange
-        _config_data = [_data[0], _data[-1]]
+        # Check first and last rows of config table
+        _config_data = [
+            conn.execute(select(db.config)
+                         .order_by(db.config.c.id).limit(1)).one(),
+            conn.execute(select(db.config)
+                         .order_by(db.config.c.id.desc()).limit(1)).one()
+        ]
         for idx, config_data in enumerate(_config_data):
             assert config_data == EXPECTED_CONFIG[idx]
             assert isinstance(config_data[0], int)
@@ -121,11 +126,12 @@ def check_database_content(db: Database) -> None:
             select(db.plane)
             .order_by(db.plane.c.abs_thick)
             .order_by(db.plane.c.abs_z)
-        )
+        ).fetchall()
+
+        # EXPECTED_PLANE does not include plane id -> result[1:]
+        assert [result[1:] for result in planes_data] == EXPECTED_PLANE
 
-        for idx, result in enumerate(planes_data):
-            # EXPECTED_PLANE does not include plane id -> result[1:]
-            assert EXPECTED_PLANE[idx] == result[1:]
+        for result in planes_data:
             assert isinstance(result[0], int)
             assert isinstance(result[1], float)
             assert isinstance(result[2], float)
@@ -149,16 +155,15 @@ def check_database_content(db: Database) -> None:
             assert isinstance(event_data[5], float)
             assert isinstance(event_data[6], int)
 
-        # Check data in hit table
+        # Check last hit of first and last events
         _hit_data = [
             conn.execute(
                 select(db.hit)
-                .where(db.hit.c.fk_event == _event_data[0][0])
-            ).fetchall()[-1],
-            conn.execute(
-                select(db.hit)
-                .where(db.hit.c.fk_event == _event_data[-1][0])
-            ).fetchall()[-1]
+                .where(db.hit.c.fk_event == event_data[0])
+                .order_by(db.hit.c.id.desc())
+                .limit(1)
+            ).one()
+            for event_data in _event_data
         ]
         for idx, hit_data in enumerate(_hit_data):
             assert hit_data[2:] == EXPECTED_HIT[idx]
@@ -261,6 +266,50 @@ def test_Database_fill(make_sources: list[Path], input_format: str) -> None:
     return None
 
 
+def test_Database_fill_crlf(make_sources: list[Path],
+                            tmp_path: Path) -> None:
+    """
+    Data-files with Windows line endings are found and filled, also after
+    a file with Unix line endings, whose header has a different length
+    """
+
+    (tmp_path / make_sources[0].name).write_bytes(
+        make_sources[0].read_bytes()
+    )
+    (tmp_path / make_sources[-1].name).write_bytes(
+        make_sources[-1].read_bytes().replace(b"\n", b"\r\n")
+    )
+
+    db = Database(DEFAULT_INPUT, ask_to_create=False)
+
+    try:
+        db.fill(tmp_path)
+        check_database_content(db)
+    finally:
+        db.drop()
+
+    return None
+
+
+def test_fill_input_order(tmp_path: Path) -> None:
+    """Data-files in a directory tree are listed in name order, depth first"""
+
+    for name in ("b.txt", "a/c.txt", "a/b/d", "c.txt", "a/e.dat"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("HEADER\n")
+
+    db = Database(DEFAULT_INPUT, ask_to_create=False)
+
+    try:
+        assert db._fill_input_handler(tmp_path) == [
+            tmp_path / name for name in ("a/b/d", "a/c.txt", "b.txt", "c.txt")
+        ]
+    finally:
+        db.drop()
+
+    return None
+
+
 def test_plane_id_uniqueness() -> None:
     """Ensure uniqueness and continuity of plane IDs"""
 
@@ -278,10 +327,10 @@ def test_plane_id_uniqueness() -> None:
 
         expected_plane_data = [
             (1, 0, 0, 0, None, None, None),
-            (3, 1, 0, 0, None, None, None),
-            (4, 2, 0, 0, None, None, None),
-            (6, 3, 0, 0, None, None, None),
-            (7, 4, 0, 0, None, None, None)
+            (2, 1, 0, 0, None, None, None),
+            (3, 2, 0, 0, None, None, None),
+            (4, 3, 0, 0, None, None, None),
+            (5, 4, 0, 0, None, None, None)
         ]
 
         # Test single inserts: u(nique) + d(uplicate) + u
@@ -325,10 +374,10 @@ def test_config_id_uniqueness() -> None:
 
         expected_result = [
             (1, 1, 1, 1, 1, 0, 0, 0, 0),
-            (3, 1, 1, 1, 2, 0, 0, 0, 0),
-            (4, 1, 1, 2, 1, 0, 0, 0, 0),
-            (6, 1, 2, 1, 1, 0, 0, 0, 0),
-            (7, 2, 1, 1, 1, 0, 0, 0, 0)
+            (2, 1, 1, 1, 2, 0, 0, 0, 0),
+            (3, 1, 1, 2, 1, 0, 0, 0, 0),
+            (4, 1, 2, 1, 1, 0, 0, 0, 0),
+            (5, 2, 1, 1, 1, 0, 0, 0, 0)
 
         ]
 
@@ -353,3 +402,136 @@ def test_config_id_uniqueness() -> None:
         db.drop()
 
     return None
+
+
+def test_Database_parallel_fill(make_sources: list[Path]) -> None:
+    """Fill database from several processes and compare with serial fill"""
+
+    tmp = make_sources[0].parent
+    sources: list[Path] = []
+    for key, data in MOCK_SOURCE_DATA.items():
+        sources.append(tmp / f"parallel-{key}.txt")
+        sources[-1].write_text(data)
+
+    def get_content(db: Database) -> tuple[list[Row[Any]], ...]:
+        # Planes and configs are inserted in input order in both cases.
+        # Event ids depend on the order of insertion, compare values only
+        with db.engine.connect() as conn:
+            planes = conn.execute(select(db.plane)).fetchall()
+            configs = conn.execute(select(db.config)).fetchall()
+            events = conn.execute(
+                select(db.event.c.e_0, db.event.c.theta, db.event.c.phi,
+                       db.event.c.n_hits, db.config.c.z_p4)
+                .join(db.config)
+            ).fetchall()
+            hits = conn.execute(
+                select(db.hit.c.plane, db.hit.c.x, db.hit.c.y,
+                       db.hit.c.z, db.hit.c.t, db.event.c.e_0)
+                .join(db.event)
+            ).fetchall()
+        return (sorted(planes), sorted(configs), sorted(events),
+                sorted(hits))
+
+    try:
+        db = Database(DEFAULT_INPUT, ask_to_create=False)
+        try:
+            db.fill(sources, max_workers=1)
+            expected = get_content(db)
+        finally:
+            db.drop()
+
+        db = Database(DEFAULT_INPUT, ask_to_create=False)
+        try:
+            db.fill(sources, max_workers=3)
+            assert get_content(db) == expected
+        finally:
+            db.drop()
+    finally:
+        for source in sources:
+            source.unlink()
+
+    return None
+
+
+def test_Database_fill_rollback(make_sources: list[Path]) -> None:
+    """A data-file with a format error must not leave any data behind"""
+
+    source = make_sources[0].parent / "malformed.data"
+    source.write_text(make_sources[0].read_text() + "1\t2\t3\n")
+
+    db = Database(DEFAULT_INPUT, ask_to_create=False)
+
+    try:
+        with pytest.raises(DataFileFormatError):
+            db._fill(source)
+
+        with db.engine.connect() as conn:
+            for table in (db.plane, db.config, db.event, db.hit):
+                assert conn.execute(select(table)).fetchall() == []
+
+        # Filling the valid file afterwards must not reuse rolled back ids
+        db.fill(make_sources[0])
+        check_database_structure(db)
+    finally:
+        source.unlink()
+        db.drop()
+
+    return None
+
+
+def test_Database_fill_extra_field(make_sources: list[Path]) -> None:
+    """Data lines with more fields than an event must be rejected"""
+
+    lines = make_sources[0].read_text().split("\n")
+    events = [idx for idx, line in enumerate(lines)
+              if idx > HEADER_LINES + 3 and line.count("\t") == 7]
+    source = make_sources[0].parent / "extra_field.data"
+
+    db = Database(DEFAULT_INPUT, ask_to_create=False)
+
+    try:
+        # First event of the data section, alone so that no hit is left
+        # to fail instead, and a later one
+        for idx, end in ((events[0], events[0] + 1), (events[-1], None)):
+            source.write_text("\n".join(
+                [*lines[:idx], lines[idx] + "\t0", *lines[idx + 1:end]]
+            ))
+            with pytest.raises(DataFileFormatError):
+                db._fill(source)
+    finally:
+        source.unlink()
+        db.drop()
+
+    return None
+
+
+def test_Database_fill_null_particle(make_sources: list[Path]) -> None:
+    """Data-files without particle type must be rejected"""
+
+    lines = make_sources[0].read_text().split("\n")
+    lines[HEADER_LINES + 1] = "null" + lines[HEADER_LINES + 1][1:]
+    source = make_sources[0].parent / "null_particle.data"
+    source.write_text("\n".join(lines))
+
+    db = Database(DEFAULT_INPUT, ask_to_create=False)
+
+    try:
+        with pytest.raises(DataFileFormatError):
+            db._fill(source)
+    finally:
+        source.unlink()
+        db.drop()
+
+    return None
+
+
+def test_Database_fill_dropped(make_sources: list[Path]) -> None:
+    """Filling a database after dropping it must fail"""
+
+    db = Database(DEFAULT_INPUT, ask_to_create=False)
+    db.drop()
+
+    with pytest.raises(FileNotFoundError):
+        db.fill(make_sources[0])
+
+    return None
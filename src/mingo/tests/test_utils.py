@@ -109,9 +109,16 @@ def test_reformat(monkeypatch, make_mock_source: Path) -> None:
         return next(user_inputs)
     monkeypatch.setattr("builtins.input", mock_input)
 
+    # Files next to the source must not be touched
+    neighbour = source.with_name("tmp_" + source.name)
+    neighbour.write_text("neighbour")
+
     # Reformat mock source file
     reformat(source)
 
+    assert sorted(source.parent.iterdir()) == sorted([source, neighbour])
+    assert neighbour.read_text() == "neighbour"
+
     with open(source, "r") as file:
 
         # Check header
@@ -138,3 +145,20 @@ def test_reformat(monkeypatch, make_mock_source: Path) -> None:
         assert file.readline() == EXPECTED_HIT
 
     return None
+
+
+@pytest.mark.fixt_data(MOCK_SOURCE + "1\t2\t3\n")
+def test_reformat_error(make_mock_source: Path) -> None:
+    """
+    Ensure that a failed reformat leaves the source directory untouched
+    """
+
+    source = make_mock_source
+
+    with pytest.raises(ValueError):
+        reformat(source, 800, 800, 16.2, 10.4)
+
+    assert list(source.parent.iterdir()) == [source]
+    assert source.read_text() == MOCK_SOURCE + "1\t2\t3\n"
+
+    return None
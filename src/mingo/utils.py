@@ -1,7 +1,7 @@
 import os
+import shutil
 from pathlib import Path
-import platform
-import tempfile
+from tempfile import NamedTemporaryFile
 from typing import Union
 
 HEADER = """HEADER
@@ -51,16 +51,10 @@ HEADER = """HEADER
         Time since first impact [ns]:
 DATA"""
 
-
-def cm2mm(value: str) -> str:
-    """
-    Convert cm into mm with five decimal places
-
-    :param value: Length in cm.
-    :return str: Length in mm.
-    """
-
-    return f"{float(value) * 10:+.4e}"
+# Event and hit lines with lengths turned from cm into mm. Source files
+# are plain ASCII, so lines are handled as bytes without decoding
+EVENT_FORMAT = b"%s\t%s\t%+.4e\t%+.4e\t%+.4e\t%s\t%s\t%s\n"
+HIT_FORMAT = b"%s\t%+.4e\t%+.4e\t%+.4e\t%s\n"
 
 
 def reformat(
@@ -91,69 +85,81 @@ def reformat(
     y_detector_plane = 999
     z_detector_plane = 22
 
-    # Create temporary formatted file
-    if platform.system() == "Darwin":
-        tmp = "/tmp"
-    else:
-        tmp = tempfile.gettempdir()
-    tmp_source = Path(tmp, "tmp_" + file.name)
-
-    with open(tmp_source, "w") as out:
-
-        # Add header
-        out.write(HEADER + "\n")
-
-        # Add CASE data
-        if e_max is None:
-            e_max = int(input("Emax [MeV]: "))
-        if e_min is None:
-            e_min = int(input("Emin [MeV]: "))
-        case_data = (
-            f"{particle}\t{n_events}\t{e_min}\t{e_max}\t{e_dist}\t{theta_min}"
-            f"\t{theta_max}\t{x_detector_plane}\t{y_detector_plane}\t"
-            f"{z_detector_plane}\n"
-        )
-        out.write(case_data)
-
-        # Add ACTIVE PLANES data
-        out.write("0\t100\t200\t400\n")
-
-        # Add PASSIVE PLANES data
-        if p2_thickness is None:
-            p2_thickness = float(input("Abs plane 2 - thickness [mm]: "))
-        if p4_thickness is None:
-            p4_thickness = float(input("Abs plane 4 - thickness [mm]: "))
-        passive_plane_data = (
-            f"null\t22\tnull\t222\tnull\t{p2_thickness}\tnull\t{p4_thickness}"
-            f"\tnull\t0\tnull\t0\n"
-        )
-        out.write(passive_plane_data)
-
-        # Add EVENTs and HITs
-        with open(file, "r") as source:
-            for _ in range(3):
-                source.readline()
-            if "HEADER" in source.readline():
-                for line in source:
-                    data = line[:-1].split("\t")
-                    if len(data) == 8:
-                        out.write(
-                            f"{data[0]}\t{data[1]}\t{cm2mm(data[2])}\t"
-                            f"{cm2mm(data[3])}\t{cm2mm(data[4])}\t"
-                            f"{data[5]}\t{data[6]}\t{data[7]}\n"
-                        )
-                    elif len(data) == 5:
-                        out.write(
-                            f"{data[0]}\t{cm2mm(data[1])}\t"
-                            f"{cm2mm(data[2])}\t{cm2mm(data[3])}\t"
-                            f"{data[4]}\n"
-                        )
-                    else:
-                        raise ValueError(f"Unexpected length {data}")
-            else:
-                os.remove(tmp_source)
-                raise ValueError("Unexpected format in source file")
-
-    tmp_source.rename(file)
+    # Create temporary formatted file next to the source, so that it can
+    # replace the source with a rename instead of a copy. Its name is unique
+    # and its extension is not valid for data-files, so it neither replaces
+    # other files nor is taken for a data-file while it exists
+    out = NamedTemporaryFile("wb", dir=file.parent, prefix=file.name + ".",
+                             suffix=".tmp", delete=False)
+    tmp_source = Path(out.name)
+
+    try:
+        with out:
+
+            # Add header
+            out.write(HEADER.encode() + b"\n")
+
+            # Add CASE data
+            if e_max is None:
+                e_max = int(input("Emax [MeV]: "))
+            if e_min is None:
+                e_min = int(input("Emin [MeV]: "))
+            case_data = (
+                f"{particle}\t{n_events}\t{e_min}\t{e_max}\t{e_dist}\t"
+                f"{theta_min}\t{theta_max}\t{x_detector_plane}\t"
+                f"{y_detector_plane}\t{z_detector_plane}\n"
+            )
+            out.write(case_data.encode())
+
+            # Add ACTIVE PLANES data
+            out.write(b"0\t100\t200\t400\n")
+
+            # Add PASSIVE PLANES data
+            if p2_thickness is None:
+                p2_thickness = float(input("Abs plane 2 - thickness [mm]: "))
+            if p4_thickness is None:
+                p4_thickness = float(input("Abs plane 4 - thickness [mm]: "))
+            passive_plane_data = (
+                f"null\t22\tnull\t222\tnull\t{p2_thickness}\tnull\t"
+                f"{p4_thickness}\tnull\t0\tnull\t0\n"
+            )
+            out.write(passive_plane_data.encode())
+
+            # Add EVENTs and HITs
+            with open(file, "rb") as source:
+                for _ in range(3):
+                    source.readline()
+                if b"HEADER" in source.readline():
+                    for line in source:
+                        data = line.rstrip(b"\r\n").split(b"\t")
+                        if len(data) == 8:
+                            out.write(EVENT_FORMAT % (
+                                data[0], data[1], float(data[2]) * 10,
+                                float(data[3]) * 10, float(data[4]) * 10,
+                                data[5], data[6], data[7]
+                            ))
+                        elif len(data) == 5:
+                            out.write(HIT_FORMAT % (
+                                data[0], float(data[1]) * 10,
+                                float(data[2]) * 10, float(data[3]) * 10,
+                                data[4]
+                            ))
+                        else:
+                            raise ValueError(
+                                "Unexpected length "
+                                f"{[field.decode() for field in data]}"
+                            )
+                else:
+                    raise ValueError("Unexpected format in source file")
+
+        # Temporary files are only readable by their owner, keep the
+        # permissions of the source instead
+        shutil.copymode(file, tmp_source)
+    except BaseException:
+        # Do not leave partial files among the sources
+        tmp_source.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_source, file)
 
     return None